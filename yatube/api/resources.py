@@ -0,0 +1,159 @@
+"""Описание JSON-представлений моделей для API.
+
+Ресурс знает, какие поля модели можно отдать, из каких столбцов они
+читаются и какие связи можно встроить в ответ. Клиент выбирает поля
+параметром ?fields=, поэтому из базы читаются только нужные столбцы,
+а связи из ?expand= подгружаются одним запросом на страницу.
+"""
+from django.contrib.auth import get_user_model
+
+from posts.models import Comment, Follow, Group, Post
+
+
+class InvalidFields(Exception):
+    """Запрошены поля или связи, которых нет у ресурса"""
+
+
+class Field:
+    def __init__(self, getter, columns=()):
+        self.getter = getter
+        self.columns = columns
+
+
+class Relation(Field):
+    """Ссылка на другой ресурс: id или встроенный объект при ?expand="""
+
+    def __init__(self, attname, resource):
+        super().__init__(lambda obj: getattr(obj, attname), (attname,))
+        self.attname = attname
+        self.resource = resource
+
+
+def _isoformat(attname):
+    return Field(lambda obj: getattr(obj, attname).isoformat(), (attname,))
+
+
+def _column(attname):
+    return Field(lambda obj: getattr(obj, attname), (attname,))
+
+
+def _stats(attname):
+    return Field(
+        lambda user: getattr(getattr(user, 'stats', None), attname, 0),
+        ('stats__' + attname,),
+    )
+
+
+class Resource:
+    def __init__(self, model, fields, related=(), embedded=None):
+        self.model = model
+        self.fields = fields
+        # select_related для полей из связанных таблиц один к одному
+        self.related = related
+        # Поля объекта, встроенного в чужой ответ через ?expand=
+        self.embedded = list(embedded or fields)
+
+    def field_names(self, fields=None):
+        """Проверить список полей из ?fields=; по умолчанию все поля"""
+        if not fields:
+            return list(self.fields)
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise InvalidFields(', '.join(sorted(unknown)))
+        return list(dict.fromkeys(fields))
+
+    def relations(self, expand):
+        """Проверить связи из ?expand="""
+        unknown = set(expand) - {
+            name for name, field in self.fields.items()
+            if isinstance(field, Relation)
+        }
+        if unknown:
+            raise InvalidFields(', '.join(sorted(unknown)))
+        return list(dict.fromkeys(expand))
+
+    def queryset(self, queryset, names, extra_columns=()):
+        """Читать из базы только столбцы выбранных полей"""
+        columns = {self.model._meta.pk.name, *extra_columns}
+        for name in names:
+            columns.update(self.fields[name].columns)
+        related = [
+            relation for relation in self.related
+            if any(column.startswith(relation + '__') for column in columns)
+        ]
+        return queryset.select_related(*related).only(*columns)
+
+    def serialize(self, objects, names, expand=()):
+        """Список словарей; связи из expand встраиваются целиком"""
+        embedded = {}
+        for name in expand:
+            if name not in names:
+                continue
+            relation = self.fields[name]
+            ids = {
+                getattr(obj, relation.attname) for obj in objects
+            } - {None}
+            resource = relation.resource
+            rows = resource.queryset(
+                resource.model.objects.all(), resource.embedded
+            ).in_bulk(ids)
+            embedded[name] = {
+                pk: resource.serialize([row], resource.embedded)[0]
+                for pk, row in rows.items()
+            }
+        result = []
+        for obj in objects:
+            item = {}
+            for name in names:
+                value = self.fields[name].getter(obj)
+                if name in embedded:
+                    value = embedded[name].get(value)
+                item[name] = value
+            result.append(item)
+        return result
+
+
+USER = Resource(get_user_model(), {
+    'id': Field(lambda user: user.pk),
+    'username': _column('username'),
+    'name': Field(
+        lambda user: user.get_full_name(), ('first_name', 'last_name')
+    ),
+    'posts_count': _stats('posts_count'),
+    'followers_count': _stats('followers_count'),
+    'following_count': _stats('following_count'),
+}, related=('stats',), embedded=('id', 'username', 'name'))
+
+GROUP = Resource(Group, {
+    'id': Field(lambda group: group.pk),
+    'slug': _column('slug'),
+    'title': _column('title'),
+    'description': _column('description'),
+    'posts_count': _column('posts_count'),
+})
+
+POST = Resource(Post, {
+    'id': Field(lambda post: post.pk),
+    'text': _column('text'),
+    'pub_date': _isoformat('pub_date'),
+    'author': Relation('author_id', USER),
+    'group': Relation('group_id', GROUP),
+    'image': Field(
+        lambda post: post.image.url if post.image else None, ('image',)
+    ),
+    'comments_count': _column('comments_count'),
+})
+
+COMMENT = Resource(Comment, {
+    'id': Field(lambda comment: comment.pk),
+    'post': _column('post_id'),
+    'text': _column('text'),
+    'created': _isoformat('created'),
+    'author': Relation('author_id', USER),
+})
+
+FOLLOW = Resource(Follow, {
+    'id': Field(lambda follow: follow.pk),
+    'user': Relation('user_id', USER),
+    'author': Relation('author_id', USER),
+})
@@ -0,0 +1,186 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.views import MAX_LIMIT
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Имя', last_name='Автора'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def get_json(self, name, kwargs=None, data=None, status=200):
+        response = self.client.get(reverse(name, kwargs=kwargs), data)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(response.content)
+
+    def test_endpoints(self):
+        """Все адреса API отдают JSON"""
+        username = {'username': ApiTest.author.get_username()}
+        slug = {'slug': ApiTest.group.slug}
+        post_id = {'post_id': ApiTest.post.pk}
+        pages = {
+            'api:posts': None,
+            'api:post': post_id,
+            'api:comments': post_id,
+            'api:groups': None,
+            'api:group': slug,
+            'api:group_posts': slug,
+            'api:profile': username,
+            'api:profile_posts': username,
+            'api:followers': username,
+            'api:following': {'username': ApiTest.reader.get_username()},
+        }
+        for name, kwargs in pages.items():
+            with self.subTest(name=name):
+                self.get_json(name, kwargs)
+
+    def test_post_fields(self):
+        """Пост отдаётся со всеми полями, связи — по id"""
+        data = self.get_json('api:post', {'post_id': ApiTest.post.pk})
+        self.assertEqual(data, {
+            'id': ApiTest.post.pk,
+            'text': ApiTest.post.text,
+            'pub_date': ApiTest.post.pub_date.isoformat(),
+            'author': ApiTest.author.pk,
+            'group': ApiTest.group.pk,
+            'image': None,
+            'comments_count': 1,
+        })
+        profile = self.get_json(
+            'api:profile', {'username': ApiTest.author.get_username()}
+        )
+        self.assertEqual(profile['name'], 'Имя Автора')
+        self.assertEqual(profile['posts_count'], 5)
+        self.assertEqual(profile['followers_count'], 1)
+
+    def test_sparse_fields_and_expand(self):
+        """?fields= ограничивает поля, ?expand= встраивает связи"""
+        data = self.get_json(
+            'api:posts', data={'fields': 'id,author', 'expand': 'author'}
+        )
+        self.assertEqual(data['results'][0], {
+            'id': ApiTest.post.pk,
+            'author': {
+                'id': ApiTest.author.pk,
+                'username': 'author',
+                'name': 'Имя Автора',
+            },
+        })
+        for params in ({'fields': 'id,secret'}, {'expand': 'text'}):
+            with self.subTest(params=params):
+                self.get_json('api:posts', data=params, status=400)
+
+    def test_cursor_pagination(self):
+        """Курсоры ведут по страницам без повторов и пропусков"""
+        data = self.get_json('api:posts', data={'limit': 2, 'fields': 'id'})
+        ids = [item['id'] for item in data['results']]
+        self.assertIsNone(data['previous'])
+        while data['next']:
+            response = self.client.get(data['next'])
+            data = json.loads(response.content)
+            ids.extend(item['id'] for item in data['results'])
+        self.assertEqual(
+            ids, [post.pk for post in reversed(ApiTest.posts)]
+        )
+        for params in (
+            {'cursor': 'испорчен'}, {'limit': MAX_LIMIT + 1}, {'limit': 'x'}
+        ):
+            with self.subTest(params=params):
+                self.get_json('api:posts', data=params, status=400)
+
+    def test_queries_do_not_grow_with_page(self):
+        """Встроенные объекты выбираются одним запросом на страницу"""
+        url = reverse('api:posts')
+        params = {'expand': 'author,group'}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {**params, 'limit': 1})
+        small = len(queries)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {**params, 'limit': 5})
+        self.assertEqual(len(queries), small)
+
+    def test_not_found_and_methods(self):
+        """Ошибки отдаются в JSON, запись запрещена"""
+        self.get_json('api:post', {'post_id': 0}, status=404)
+        self.get_json('api:group_posts', {'slug': 'missing'}, status=404)
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304, а после правки — 200"""
+        url = reverse('api:post', kwargs={'post_id': ApiTest.post.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=ApiTest.post, author=ApiTest.author, text='Ещё'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['comments_count'], 2)
+
+    def test_list_conditional_get_follows_comments(self):
+        """Списки постов отдают 200 и новый comments_count после комментария"""
+        urls = [
+            reverse('api:posts'),
+            reverse('api:group_posts', kwargs={'slug': ApiTest.group.slug}),
+            reverse(
+                'api:profile_posts',
+                kwargs={'username': ApiTest.author.username}
+            ),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+        comments = Post.objects.get(pk=ApiTest.post.pk).comments_count + 1
+        Comment.objects.create(
+            post=ApiTest.post, author=ApiTest.author, text='Ещё'
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    json.loads(response.content)['results'][0][
+                        'comments_count'
+                    ],
+                    comments
+                )
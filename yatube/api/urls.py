@@ -0,0 +1,32 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.post_list, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comment_list, name='comments'
+    ),
+    path('groups/', views.group_list, name='groups'),
+    path('groups/<slug:slug>/', views.group_detail, name='group'),
+    path(
+        'groups/<slug:slug>/posts/',
+        views.group_posts, name='group_posts'
+    ),
+    path('profiles/<str:username>/', views.profile, name='profile'),
+    path(
+        'profiles/<str:username>/posts/',
+        views.profile_posts, name='profile_posts'
+    ),
+    path(
+        'profiles/<str:username>/followers/',
+        views.followers, name='followers'
+    ),
+    path(
+        'profiles/<str:username>/following/',
+        views.following, name='following'
+    ),
+]
@@ -0,0 +1,197 @@
+"""Версия 1 JSON API только для чтения.
+
+Списки пагинируются курсором (?cursor=, ?limit=), поля выбираются
+параметром ?fields=, связанные объекты встраиваются параметром
+?expand=. Ответы несут ETag и Last-Modified по поколениям кеша, как
+HTML-страницы, поэтому повторный запрос клиента обычно получает 304.
+"""
+from functools import wraps
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from posts.cache import conditional_feed
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import (
+    COMMENT_ORDERING, CURSOR_PARAM, POST_ORDERING, CursorPaginator,
+    InvalidCursor,
+)
+from posts.views import post_author_scope
+
+from .resources import (
+    COMMENT, FOLLOW, GROUP, POST, USER, InvalidFields
+)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+FOLLOW_ORDERING = ('-pk',)
+GROUP_ORDERING = ('pk',)
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+User = get_user_model()
+
+
+class BadRequest(Exception):
+    """Ошибка в параметрах запроса"""
+
+
+def error(status, detail):
+    return JsonResponse(
+        {'detail': detail}, status=status, json_dumps_params=JSON_PARAMS
+    )
+
+
+def api_view(view):
+    """Разрешить только GET и HEAD и отдавать ошибки в JSON"""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return error(HTTPStatus.NOT_FOUND, 'Не найдено')
+        except BadRequest as exc:
+            return error(HTTPStatus.BAD_REQUEST, str(exc))
+    return wrapper
+
+
+def _names(request, param):
+    value = request.GET.get(param, '')
+    return [name for name in value.split(',') if name]
+
+
+def _selection(request, resource):
+    try:
+        names = resource.field_names(_names(request, 'fields'))
+        expand = resource.relations(_names(request, 'expand'))
+    except InvalidFields as exc:
+        raise BadRequest(f'Неизвестные поля: {exc}')
+    return names, expand
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def _link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def list_response(request, resource, queryset, ordering):
+    """Страница объектов по курсору из запроса"""
+    names, expand = _selection(request, resource)
+    queryset = resource.queryset(
+        queryset, names, [name.lstrip('-') for name in ordering]
+    )
+    paginator = CursorPaginator(queryset, _limit(request), ordering)
+    try:
+        page = paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        raise BadRequest('Неверный курсор')
+    return JsonResponse({
+        'results': resource.serialize(page.object_list, names, expand),
+        'next': _link(request, page.next_cursor),
+        'previous': _link(request, page.previous_cursor),
+    }, json_dumps_params=JSON_PARAMS)
+
+
+def object_response(request, resource, queryset, **lookup):
+    names, expand = _selection(request, resource)
+    obj = get_object_or_404(resource.queryset(queryset, names), **lookup)
+    return JsonResponse(
+        resource.serialize([obj], names, expand)[0],
+        json_dumps_params=JSON_PARAMS,
+    )
+
+
+@api_view
+@conditional_feed('posts', 'comments', 'groups', 'users')
+def post_list(request):
+    return list_response(request, POST, Post.objects.all(), POST_ORDERING)
+
+
+@api_view
+@conditional_feed(
+    'post:{post_id}', 'groups', 'users', scopes=post_author_scope
+)
+def post_detail(request, post_id):
+    return object_response(request, POST, Post.objects.all(), pk=post_id)
+
+
+@api_view
+@conditional_feed('post:{post_id}', 'users')
+def comment_list(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return list_response(
+        request, COMMENT, Comment.objects.filter(post_id=post_id),
+        COMMENT_ORDERING,
+    )
+
+
+@api_view
+@conditional_feed('posts', 'groups')
+def group_list(request):
+    return list_response(request, GROUP, Group.objects.all(), GROUP_ORDERING)
+
+
+@api_view
+@conditional_feed('group:{slug}', 'groups')
+def group_detail(request, slug):
+    return object_response(request, GROUP, Group.objects.all(), slug=slug)
+
+
+@api_view
+@conditional_feed('group:{slug}', 'comments', 'groups', 'users')
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return list_response(
+        request, POST, Post.objects.filter(group=group), POST_ORDERING
+    )
+
+
+@api_view
+@conditional_feed('author:{username}', 'users')
+def profile(request, username):
+    return object_response(
+        request, USER, User.objects.all(), username=username
+    )
+
+
+@api_view
+@conditional_feed('author:{username}', 'comments', 'groups', 'users')
+def profile_posts(request, username):
+    user = get_object_or_404(User.objects.only('pk'), username=username)
+    return list_response(
+        request, POST, Post.objects.filter(author=user), POST_ORDERING
+    )
+
+
+@api_view
+@conditional_feed('author:{username}', 'users')
+def followers(request, username):
+    user = get_object_or_404(User.objects.only('pk'), username=username)
+    return list_response(
+        request, FOLLOW, Follow.objects.filter(author=user), FOLLOW_ORDERING
+    )
+
+
+@api_view
+@conditional_feed('author:{username}', 'users')
+def following(request, username):
+    user = get_object_or_404(User.objects.only('pk'), username=username)
+    return list_response(
+        request, FOLLOW, Follow.objects.filter(user=user), FOLLOW_ORDERING
+    )
@@ -0,0 +1,65 @@
+"""Бэкенд SQLite, настроенный для нескольких процессов сервера.
+
+Отличия от django.db.backends.sqlite3:
+
+* каждое новое соединение выполняет PRAGMA из DEFAULT_PRAGMAS: журнал
+  WAL (читатели не ждут писателя), synchronous=NORMAL, ожидание
+  блокировки busy_timeout, mmap и увеличенный кеш страниц;
+* транзакции transaction.atomic начинаются с BEGIN IMMEDIATE: блокировка
+  записи берётся сразу и ждёт busy_timeout. При обычном BEGIN две
+  транзакции, которые сначала читали, а потом пишут, не могут дождаться
+  друг друга, и одна сразу получает «database is locked».
+
+В OPTIONS можно передать 'pragmas' — словарь, который дополняет и
+переопределяет DEFAULT_PRAGMAS, и 'transaction_mode' (DEFERRED,
+IMMEDIATE или EXCLUSIVE). Постоянные соединения включаются обычной
+настройкой CONN_MAX_AGE.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def pragmas(self):
+        options = self.settings_dict['OPTIONS']
+        return {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'IMMEDIATE'
+        ).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # journal_mode первым: mmap и кеш относятся уже к журналу WAL
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from core import stress
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверить пропускную способность SQLite при параллельной записи '
+        'и чтении из нескольких процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument(
+            '--operations', type=int, default=500,
+            help='Число операций каждого процесса',
+        )
+        parser.add_argument(
+            '--engine', action='append',
+            help=(
+                'Бэкенд базы; можно указать несколько раз. По умолчанию '
+                'сравниваются обычный и настроенный бэкенды'
+            ),
+        )
+        parser.add_argument(
+            '--path', help='Файл базы; по умолчанию временный',
+        )
+
+    def handle(self, *args, **options):
+        engines = options['engine'] or [
+            stress.STOCK_ENGINE, stress.TUNED_ENGINE
+        ]
+        directory = None
+        path = options['path']
+        if path is None:
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'stress.sqlite3')
+        try:
+            for engine in engines:
+                summary = stress.run(
+                    path, engine, options['writers'], options['readers'],
+                    options['operations'],
+                )
+                self.stdout.write(
+                    f'{engine}: {summary["seconds"]} с, '
+                    f'записей {summary["writes"]} '
+                    f'({summary["writes_per_second"]}/с, ошибок '
+                    f'{summary["write_errors"]}), чтений {summary["reads"]} '
+                    f'({summary["reads_per_second"]}/с, ошибок '
+                    f'{summary["read_errors"]})'
+                )
+                stress.remove(path)
+        finally:
+            if directory is not None:
+                os.rmdir(directory)
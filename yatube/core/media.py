@@ -0,0 +1,180 @@
+"""Отдача файлов MEDIA_ROOT.
+
+После проверки доступа файл передаётся фронтенд-серверу заголовком
+MEDIA_SENDFILE_HEADER (X-Accel-Redirect для nginx, X-Sendfile для
+Apache и lighttpd). Если заголовок не задан, файл отдаёт FileResponse:
+WSGI-сервер с wsgi.file_wrapper (например, gunicorn) передаёт его
+через sendfile без копирования в Python. Поддерживаются запросы
+диапазонов, ETag и Last-Modified; файлы с именами по хешу содержимого
+кешируются браузером навсегда.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+class RangeFile:
+    """Файл, из которого читается не больше length байт с позиции start.
+
+    fileno() отдаётся WSGI-серверу, чтобы он мог передать диапазон
+    через sendfile, начиная с текущей позиции файла.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def is_immutable(path):
+    return any(
+        re.search(pattern, path)
+        for pattern in settings.MEDIA_IMMUTABLE_PATTERNS
+    )
+
+
+def has_access(request, path):
+    """Публичные каталоги доступны всем, остальные — только после входа"""
+    if path.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES)):
+        return True
+    return request.user.is_authenticated
+
+
+def get_etag(path, stats):
+    """ETag по хешу из имени или по времени изменения и размеру"""
+    if is_immutable(path):
+        return quote_etag(os.path.splitext(os.path.basename(path))[0])
+    return quote_etag(f'{stats.st_mtime_ns:x}-{stats.st_size:x}')
+
+
+def parse_range(header, size):
+    """Вернуть (начало, длина) единственного диапазона или None.
+
+    Несколько диапазонов не поддерживаются: такой заголовок
+    игнорируется и отдаётся весь файл. Для диапазона за концом файла
+    возбуждается ValueError.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def cache_control(path):
+    if not path.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES)):
+        return 'private, max-age=0'
+    if is_immutable(path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def file_response(request, full_path, stats, etag):
+    size = stats.st_size
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        # Файл изменился с прошлого запроса: отдаём его целиком
+        header = ''
+    try:
+        byte_range = parse_range(header, size) if header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'))
+        response['Content-Length'] = size
+    else:
+        start, length = byte_range
+        response = FileResponse(
+            RangeFile(open(full_path, 'rb'), start, length), status=206
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{size}'
+        )
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def normalize(path):
+    """Относительный путь без «..» и лишних разделителей.
+
+    Доступ, кеширование и заголовок sendfile проверяются по этому пути,
+    поэтому /media/posts/../private/ не проходит как публичный posts/.
+    """
+    path = posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+    if path in ('', '.') or path == '..' or path.startswith('../'):
+        raise Http404(path)
+    return path
+
+
+def serve(request, path):
+    """Отдать файл из MEDIA_ROOT"""
+    path = normalize(path)
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404(path)
+    if not stat.S_ISREG(stats.st_mode) or not has_access(request, path):
+        raise Http404(path)
+    etag = get_etag(path, stats)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stats.st_mtime)
+    )
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    header = settings.MEDIA_SENDFILE_HEADER
+    if not_modified is not None:
+        response = not_modified
+    elif header:
+        response = HttpResponse(content_type=content_type)
+        if header == 'X-Accel-Redirect':
+            response[header] = settings.MEDIA_SENDFILE_PREFIX + path
+        else:
+            response[header] = full_path
+    else:
+        response = file_response(request, full_path, stats, etag)
+        response['Content-Type'] = content_type
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stats.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    return response
@@ -0,0 +1,238 @@
+"""Метрики запросов по именам адресов.
+
+Для каждого адреса (например, posts:index) в памяти процесса копятся
+гистограммы полного времени ответа, времени SQL, числа запросов к базе
+и времени отрисовки шаблонов, а также попадания и промахи кешей. Данные
+собирает core.middleware.MetricsMiddleware, отдаёт представление
+core.views.metrics в текстовом формате Prometheus и, если задан
+METRICS_LOG_INTERVAL, периодически пишет журнал core.metrics.
+
+Гистограммы хранят только счётчики корзин, поэтому запись наблюдения —
+это поиск корзины и несколько сложений под одной блокировкой на запрос.
+У каждого процесса сервера свои метрики.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.template.backends import django as django_backend
+from django.template.exceptions import TemplateDoesNotExist
+
+SECONDS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNRESOLVED = '<unresolved>'
+
+_lock = threading.Lock()
+_views = {}
+_local = threading.local()
+
+
+class Histogram:
+    """Гистограмма с фиксированными верхними границами корзин"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Пары (граница, число наблюдений не больше неё)"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Оценка квантиля: верхняя граница корзины, где он лежит"""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+        return '+Inf'
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.duration = Histogram(SECONDS_BUCKETS)
+        self.db_duration = Histogram(SECONDS_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.template_duration = Histogram(SECONDS_BUCKETS)
+        self.statuses = Counter()
+        self.cache = Counter()
+
+
+class RequestStats:
+    """Данные текущего запроса, которые копятся по ходу его обработки"""
+
+    def __init__(self):
+        self.db_time = 0
+        self.queries = 0
+        self.template_time = 0
+        self.template_depth = 0
+        self.cache = Counter()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def start():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish():
+    _local.stats = None
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record_cache(name, hit):
+    """Учесть попадание или промах кеша name в текущем запросе"""
+    stats = current()
+    if stats is not None:
+        stats.cache[name, 'hit' if hit else 'miss'] += 1
+
+
+def observe(view_name, status, duration, stats):
+    with _lock:
+        metrics = _views.get(view_name)
+        if metrics is None:
+            metrics = _views[view_name] = ViewMetrics()
+        metrics.duration.observe(duration)
+        metrics.db_duration.observe(stats.db_time)
+        metrics.queries.observe(stats.queries)
+        metrics.template_duration.observe(stats.template_time)
+        metrics.statuses[status] += 1
+        metrics.cache.update(stats.cache)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def snapshot():
+    """Сводка по адресам для журнала: число запросов, p50/p95, кеши"""
+    with _lock:
+        return {
+            view_name: {
+                'requests': metrics.duration.count,
+                'p50_s': metrics.duration.quantile(0.5),
+                'p95_s': metrics.duration.quantile(0.95),
+                'db_s': round(metrics.db_duration.sum, 6),
+                'queries': metrics.queries.sum,
+                'template_s': round(metrics.template_duration.sum, 6),
+                'statuses': dict(metrics.statuses),
+                'cache': {
+                    f'{name}.{result}': count
+                    for (name, result), count in metrics.cache.items()
+                },
+            }
+            for view_name, metrics in _views.items()
+        }
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')
+
+
+def _histogram_lines(name, view_name, histogram):
+    label = f'view="{_escape(view_name)}"'
+    for bound, total in histogram.cumulative():
+        yield f'{name}_bucket{{{label},le="{bound}"}} {total}'
+    yield f'{name}_sum{{{label}}} {histogram.sum}'
+    yield f'{name}_count{{{label}}} {histogram.count}'
+
+
+HISTOGRAMS = (
+    ('yatube_request_duration_seconds', 'duration',
+     'Время ответа'),
+    ('yatube_db_duration_seconds', 'db_duration',
+     'Время SQL-запросов за ответ'),
+    ('yatube_db_queries', 'queries',
+     'Число SQL-запросов за ответ'),
+    ('yatube_template_duration_seconds', 'template_duration',
+     'Время отрисовки шаблонов за ответ'),
+)
+
+
+def exposition():
+    """Метрики в текстовом формате Prometheus"""
+    lines = []
+    with _lock:
+        views = sorted(_views.items())
+        for name, attr, help_text in HISTOGRAMS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for view_name, metrics in views:
+                lines.extend(
+                    _histogram_lines(name, view_name, getattr(metrics, attr))
+                )
+        lines.append('# HELP yatube_responses_total Ответы по кодам')
+        lines.append('# TYPE yatube_responses_total counter')
+        for view_name, metrics in views:
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(
+                    f'yatube_responses_total{{view="{_escape(view_name)}",'
+                    f'status="{status}"}} {count}'
+                )
+        lines.append('# HELP yatube_cache_total Обращения к кешам')
+        lines.append('# TYPE yatube_cache_total counter')
+        for view_name, metrics in views:
+            for (cache, result), count in sorted(metrics.cache.items()):
+                lines.append(
+                    f'yatube_cache_total{{view="{_escape(view_name)}",'
+                    f'cache="{_escape(cache)}",result="{result}"}} {count}'
+                )
+    return '\n'.join(lines) + '\n'
+
+
+class Template(django_backend.Template):
+    """Шаблон, который учитывает время отрисовки в метриках запроса.
+
+    Вложенные отрисовки (render_to_string внутри тегов) входят во время
+    внешнего шаблона и отдельно не считаются.
+    """
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django с учётом времени отрисовки"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,52 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('core.metrics')
+
+
+class MetricsMiddleware:
+    """Учитывает время, SQL, шаблоны и кеши каждого запроса.
+
+    Должна стоять первой в MIDDLEWARE, чтобы время ответа включало
+    остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logged_at = time.monotonic()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        stats = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.execute_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.finish()
+        match = request.resolver_match
+        metrics.observe(
+            match.view_name if match else metrics.UNRESOLVED,
+            response.status_code,
+            time.perf_counter() - started,
+            stats,
+        )
+        self.log()
+        return response
+
+    def log(self):
+        interval = settings.METRICS_LOG_INTERVAL
+        if not interval or time.monotonic() - self.logged_at < interval:
+            return
+        self.logged_at = time.monotonic()
+        logger.info(json.dumps(metrics.snapshot(), ensure_ascii=False))
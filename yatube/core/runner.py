@@ -0,0 +1,27 @@
+"""Запуск тестов с собственным кешем.
+
+Кеш из настроек общий для всех процессов сервера на этой машине, а
+тесты вызывают cache.clear(). Чтобы они не стирали кеш работающего
+сервера и не зависели от его содержимого, на время тестов кеш
+подменяется на LocMemCache текущего процесса.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_caches = override_settings(CACHES=TEST_CACHES)
+        self.test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,129 @@
+"""Нагрузочная проверка SQLite несколькими процессами.
+
+Процессы-писатели вставляют строки короткими транзакциями, как
+post_create и add_comment, процессы-читатели в это время выбирают
+последние строки. Каждый процесс открывает свою базу через указанный
+бэкенд, поэтому так можно сравнить core.db.sqlite3 с обычным
+django.db.backends.sqlite3 и увидеть ошибки «database is locked».
+"""
+import multiprocessing
+import os
+import time
+
+import django
+from django.apps import apps
+from django.db import OperationalError, connections, transaction
+
+ALIAS = 'stress'
+TABLE = 'stress_item'
+STOCK_ENGINE = 'django.db.backends.sqlite3'
+TUNED_ENGINE = 'core.db.sqlite3'
+
+
+def connect(engine, path):
+    """Соединение с базой path через бэкенд engine"""
+    if not apps.ready:
+        django.setup()
+    # Обёртка соединения кешируется; для другого бэкенда нужна новая
+    disconnect()
+    connections.databases[ALIAS] = {
+        'ENGINE': engine, 'NAME': path, 'OPTIONS': {},
+    }
+    return connections[ALIAS]
+
+
+def disconnect():
+    if ALIAS in connections.databases:
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        del connections.databases[ALIAS]
+
+
+def prepare(engine, path):
+    """Создать пустую таблицу для проверки"""
+    connection = connect(engine, path)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, '
+            'worker INTEGER NOT NULL, value TEXT NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX {TABLE}_worker ON {TABLE} (worker)')
+    disconnect()
+
+
+def _write(cursor, worker, number):
+    # Сначала чтение, потом запись — как у сохранения модели с
+    # проверкой и обновлением счётчика
+    cursor.execute(
+        f'SELECT COUNT(*) FROM {TABLE} WHERE worker = %s', [worker]
+    )
+    cursor.execute(
+        f'INSERT INTO {TABLE} (worker, value) VALUES (%s, %s)',
+        [worker, f'{worker}:{number}'],
+    )
+
+
+def _read(cursor, worker, number):
+    cursor.execute(
+        f'SELECT id, value FROM {TABLE} ORDER BY id DESC LIMIT 20'
+    )
+    cursor.fetchall()
+
+
+def worker(task):
+    """Выполнить operations операций; вернуть (роль, успешно, ошибок)"""
+    engine, path, role, number, operations = task
+    connection = connect(engine, path)
+    action = _write if role == 'write' else _read
+    done = errors = 0
+    for step in range(operations):
+        try:
+            with transaction.atomic(using=ALIAS):
+                with connection.cursor() as cursor:
+                    action(cursor, number, step)
+            done += 1
+        except OperationalError:
+            errors += 1
+    disconnect()
+    return role, done, errors
+
+
+def run(path, engine=TUNED_ENGINE, writers=4, readers=4, operations=200):
+    """Запустить процессы и вернуть сводку с пропускной способностью"""
+    prepare(engine, path)
+    tasks = [
+        (engine, path, 'write', number, operations)
+        for number in range(writers)
+    ] + [
+        (engine, path, 'read', number, operations)
+        for number in range(readers)
+    ]
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() \
+        else 'spawn'
+    context = multiprocessing.get_context(method)
+    started = time.perf_counter()
+    with context.Pool(len(tasks)) as pool:
+        results = pool.map(worker, tasks)
+    elapsed = time.perf_counter() - started
+    summary = {'engine': engine, 'seconds': round(elapsed, 3)}
+    for role in ('write', 'read'):
+        done = sum(ok for kind, ok, _ in results if kind == role)
+        summary[f'{role}s'] = done
+        summary[f'{role}_errors'] = sum(
+            failed for kind, _, failed in results if kind == role
+        )
+        summary[f'{role}s_per_second'] = round(done / elapsed, 1)
+    connection = connect(engine, path)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        summary['rows'] = cursor.fetchone()[0]
+    disconnect()
+    return summary
+
+
+def remove(path):
+    """Удалить файл базы вместе с журналами WAL"""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
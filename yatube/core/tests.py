@@ -1,6 +1,22 @@
-from django.test import TestCase, Client
+import os
+import shutil
+import tempfile
 from http import HTTPStatus
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.urls import reverse
+
+from core import metrics, runner, stress
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = 'posts/ab/' + 'ab' * 32 + '.jpg'
+CONTENT = b'0123456789'
+
 
 class ViewTestClass(TestCase):
     def setUp(self):
@@ -10,3 +26,180 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED_NAME, 'posts/plain.jpg', 'private/doc.txt'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_serve_file(self):
+        """Файл отдаётся целиком с ETag и вечным кешем для хешей"""
+        response = self.client.get(settings.MEDIA_URL + HASHED_NAME)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['ETag'], '"' + 'ab' * 32 + '"')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(settings.MEDIA_URL + 'posts/plain.jpg')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_not_modified(self):
+        """Совпавший If-None-Match даёт 304 без тела"""
+        url = settings.MEDIA_URL + 'posts/plain.jpg'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_range(self):
+        """Запрос диапазона отдаёт только его байты"""
+        url = settings.MEDIA_URL + HASHED_NAME
+        ranges = {
+            'bytes=2-4': (b'234', 'bytes 2-4/10'),
+            'bytes=7-': (b'789', 'bytes 7-9/10'),
+            'bytes=-2': (b'89', 'bytes 8-9/10'),
+        }
+        for header, (content, content_range) in ranges.items():
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT
+                )
+                self.assertEqual(
+                    b''.join(response.streaming_content), content
+                )
+                self.assertEqual(response['Content-Range'], content_range)
+        response = self.client.get(url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile(self):
+        """С заголовком sendfile файл отдаёт фронтенд-сервер"""
+        response = self.client.get(settings.MEDIA_URL + 'posts/plain.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_SENDFILE_PREFIX + 'posts/plain.jpg'
+        )
+        self.assertEqual(response.content, b'')
+        response = self.client.get(
+            settings.MEDIA_URL + 'posts/./x/%2e%2e/plain.jpg'
+        )
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_SENDFILE_PREFIX + 'posts/plain.jpg'
+        )
+
+    def test_access(self):
+        """Закрытые и несуществующие файлы отдают 404"""
+        urls = [
+            settings.MEDIA_URL + 'private/doc.txt',
+            settings.MEDIA_URL + 'posts/missing.jpg',
+            settings.MEDIA_URL + '../settings.py',
+            settings.MEDIA_URL + 'posts/',
+            settings.MEDIA_URL + 'posts/%2e%2e/private/doc.txt',
+            settings.MEDIA_URL + 'posts/../private/doc.txt',
+            settings.MEDIA_URL + 'posts/%2e%2e/%2e%2e/yatube/settings.py',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_metrics_by_view(self):
+        """Метрики копятся по имени адреса и отдаются в /metrics/"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        view = metrics.snapshot()['posts:index']
+        self.assertEqual(view['requests'], 2)
+        self.assertEqual(view['statuses'], {HTTPStatus.OK: 2})
+        self.assertGreater(view['queries'], 0)
+        self.assertGreater(view['template_s'], 0)
+        self.assertEqual(view['cache']['feed.hit'], 1)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_request_duration_seconds_count{view="posts:index"} 2'
+        )
+        self.assertContains(
+            response,
+            'yatube_cache_total{view="posts:index",cache="feed",'
+            'result="miss"} 1'
+        )
+
+    def test_metrics_access(self):
+        """Без входа /metrics/ не показывается даже запросам через прокси"""
+        for address in ('127.0.0.1', '10.0.0.1'):
+            with self.subTest(address=address):
+                response = self.client.get(
+                    reverse('metrics'), REMOTE_ADDR=address
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            response = self.client.get(
+                reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'stress.sqlite3')
+
+    def test_connection_pragmas(self):
+        """Новое соединение включает WAL, busy_timeout и BEGIN IMMEDIATE"""
+        connection = stress.connect(stress.TUNED_ENGINE, self.path)
+        self.addCleanup(stress.disconnect)
+        expected = {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': 5000,
+            'temp_store': 2,
+        }
+        with connection.cursor() as cursor:
+            for name, value in expected.items():
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], value)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_concurrent_writes_do_not_fail(self):
+        """Параллельные писатели и читатели не получают database is locked"""
+        summary = stress.run(
+            self.path, stress.TUNED_ENGINE, writers=4, readers=4,
+            operations=50,
+        )
+        self.assertEqual(summary['write_errors'], 0)
+        self.assertEqual(summary['read_errors'], 0)
+        self.assertEqual(summary['rows'], 4 * 50)
+
+
+class TestRunnerTest(SimpleTestCase):
+
+    def test_tests_use_own_cache(self):
+        """Тесты не трогают общий кеш сервера"""
+        self.assertEqual(settings.CACHES, runner.TEST_CACHES)
+        self.assertIsInstance(caches['default'], LocMemCache)
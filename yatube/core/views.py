@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
 from http import HTTPStatus
 
+from . import metrics as request_metrics
+
 
 def page_not_found(request, exception):
     return render(
@@ -17,3 +21,20 @@ def csrf_failure(request, reason=''):
         'core/403csrf.html',
         status=HTTPStatus.FORBIDDEN
     )
+
+
+def metrics(request):
+    """Метрики запросов в формате Prometheus.
+
+    Доступны сотрудникам и адресам из METRICS_ALLOWED_IPS, который по
+    умолчанию пуст: за обратным прокси REMOTE_ADDR у всех запросов один.
+    """
+    if not (
+        request.user.is_staff
+        or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    ):
+        return page_not_found(request, None)
+    return HttpResponse(
+        request_metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
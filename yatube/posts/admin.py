@@ -1,8 +1,117 @@
+import hashlib
+
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Paginator
+from django.utils.functional import cached_property
+
+from . import search
+from .cache import get_generations
 from .models import Post, Group, Comment, Follow
+from .utils import estimate_count
+
+# Таблицы без фильтров больше этого числа строк считаются по статистике
+# СУБД; остальные списки считаются точно, но не чаще раза в COUNT_SECONDS
+ESTIMATE_THRESHOLD = 10000
+COUNT_SECONDS = 60 * 10
+# Сколько лучших совпадений полнотекстового поиска показывать в админке
+SEARCH_LIMIT = 500
+CHOICES_SECONDS = 60 * 60
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) на каждую страницу.
+
+    Для большой таблицы без фильтров число строк берётся из статистики
+    СУБД. Оценка может быть меньше настоящего числа, поэтому страницы
+    за её пределами не отклоняются. Точное число для остальных списков
+    кешируется по тексту запроса и поколению области scope.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, scope=None):
+        super().__init__(
+            object_list, per_page, orphans, allow_empty_first_page
+        )
+        self.scope = scope
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                self.estimated = True
+                return estimate
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        generation = (
+            get_generations(self.scope)[self.scope] if self.scope else ''
+        )
+        key = 'admin:count:{}'.format(hashlib.md5(
+            f'{generation}:{sql}:{params}'.encode()
+        ).hexdigest())
+        return cache.get_or_set(key, queryset.count, COUNT_SECONDS)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+def group_choices():
+    """Варианты выбора группы, общие для всех строк и запросов.
+
+    Ключ включает поколение области 'groups', поэтому правка групп
+    сбрасывает список.
+    """
+    key = 'admin:group_choices:{}'.format(get_generations('groups')['groups'])
+    choices = cache.get(key)
+    if choices is None:
+        choices = [('', '---------')] + list(
+            Group.objects.order_by('title').values_list('pk', 'title')
+        )
+        cache.set(key, choices, CHOICES_SECONDS)
+    return choices
 
 
-class PostAdmin(admin.ModelAdmin):
+class ScalableAdmin(admin.ModelAdmin):
+    """Основа админок для больших таблиц.
+
+    Не считает полный размер таблицы для каждой страницы и использует
+    EstimatedCountPaginator вместо COUNT(*) на каждый запрос.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    # Область posts.cache, смена поколения которой сбрасывает число строк
+    count_scope = None
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            scope=self.count_scope,
+        )
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,12 +120,55 @@ class PostAdmin(admin.ModelAdmin):
         'group'
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    count_scope = 'posts'
+    raw_id_fields = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        match = request and request.resolver_match
+        if db_field.name == 'group' and match and (
+            match.url_name.endswith('_changelist')
+        ):
+            # Для list_editable список групп выбирается один раз, а не
+            # отдельным запросом в каждой строке
+            formfield.choices = group_choices()
+        return formfield
+
+    def get_search_results(self, request, queryset, search_term):
+        """Искать по поисковому индексу вместо LIKE по всей таблице"""
+        if not search_term:
+            return queryset, False
+        hits = search.get_backend().search(search_term, SEARCH_LIMIT)
+        return queryset.filter(pk__in=[pk for _, pk in hits]), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('post', 'author')
+    ordering = ('-pk',)
+
+
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    ordering = ('-pk',)
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,244 @@
+"""Замер страниц постов через WSGI-приложение.
+
+Каждый адрес из READ_ONLY_VIEWS запрашивается GET-запросом от имени
+пользователя с подписками, с аргументами из случайных постов, групп и
+авторов. Запросы проходят весь стек middleware, как на сервере; для
+каждого адреса считаются перцентили задержки, число SQL-запросов и
+пропускная способность. Результаты сохраняются в JSON, чтобы сравнивать
+прогоны между собой.
+"""
+import platform
+import random
+import statistics
+import time
+from string import Formatter
+from urllib.parse import quote
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count, Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from . import urls
+from .dataset import WORDS
+from .feeds import FEED_TYPES
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+# Замеряются только адреса posts.urls, которые ничего не меняют: подписка
+# и отписка пишут в базу даже на GET, а выгрузки отдают всю историю, и
+# прогоны с ними нельзя было бы сравнивать между собой
+READ_ONLY_VIEWS = (
+    'index', 'index_feed', 'group_list', 'group_feed', 'profile',
+    'profile_feed', 'post_detail', 'comments', 'search', 'follow_index',
+    'post_create', 'post_edit',
+)
+# Строки запроса адресов из READ_ONLY_VIEWS; {имя} в них, как и в
+# аргументах адреса, заменяется случайным значением из Samples
+QUERIES = {
+    'search': 'q={word}',
+}
+# Дополнительные сценарии: имя, адрес из posts.urls и строка запроса
+EXTRA_CASES = (
+    ('index_deep_page', 'index', 'page=50'),
+)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(0, int(round(percent / 100 * len(ordered) + 0.5)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def sample_pks(model, count, rng):
+    """Случайные существующие pk без ORDER BY RANDOM()"""
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    pks = []
+    for _ in range(count):
+        pk = model.objects.filter(
+            pk__gte=rng.randint(bounds['low'], bounds['high'])
+        ).order_by('pk').values_list('pk', flat=True).first()
+        pks.append(pk)
+    return pks
+
+
+class Samples:
+    """Значения аргументов адресов и строк запроса.
+
+    post_id, slug и username берутся из случайных строк базы, kind — из
+    типов лент, word — из словаря, которым generate_dataset пишет посты.
+    """
+
+    def __init__(self, rng, size=100):
+        self.rng = rng
+        self.values = {
+            'post_id': sample_pks(Post, size, rng),
+            'slug': list(Group.objects.filter(
+                pk__in=sample_pks(Group, size, rng)
+            ).values_list('slug', flat=True)),
+            'username': list(User.objects.filter(
+                pk__in=sample_pks(User, size, rng)
+            ).values_list('username', flat=True)),
+            'kind': list(FEED_TYPES),
+            'word': list(WORDS),
+        }
+
+    def kwargs(self, pattern):
+        names = pattern.pattern.converters.keys()
+        if any(not self.values[name] for name in names):
+            return None
+        return {name: self.rng.choice(self.values[name]) for name in names}
+
+    def query(self, template):
+        """Строка запроса по шаблону вида 'q={word}'"""
+        names = [name for _, name, _, _ in Formatter().parse(template) if name]
+        if any(not self.values[name] for name in names):
+            return None
+        return template.format(**{
+            name: quote(str(self.rng.choice(self.values[name])))
+            for name in names
+        })
+
+
+def benchmark_user():
+    """Пользователь с наибольшим числом подписок"""
+    return User.objects.annotate(
+        following_total=Count('follower')
+    ).order_by('-following_total').first()
+
+
+def cases():
+    """Пары (имя сценария, шаблон адреса, строка запроса)"""
+    patterns = {pattern.name: pattern for pattern in urls.urlpatterns}
+    for name in READ_ONLY_VIEWS:
+        yield name, patterns[name], QUERIES.get(name, '')
+    for name, url_name, query in EXTRA_CASES:
+        yield name, patterns[url_name], query
+
+
+@contextmanager
+def count_queries():
+    counter = [0]
+
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def request(handler, path, query, cookie):
+    """Выполнить GET через WSGI; вернуть код ответа"""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    status = []
+    body = handler(environ, lambda code, headers: status.append(code))
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0])
+
+
+def run(requests=100, warmup=5, seed=None, user=None, progress=None):
+    """Замерить все сценарии; вернуть словарь для сохранения в JSON"""
+    rng = random.Random(seed)
+    handler = WSGIHandler()
+    user = user or benchmark_user()
+    cookie = ''
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        name = settings.SESSION_COOKIE_NAME
+        cookie = f'{name}={client.cookies[name].value}'
+    samples = Samples(rng)
+    results = {}
+    for name, pattern, query in cases():
+        kwargs = samples.kwargs(pattern)
+        if kwargs is None or samples.query(query) is None:
+            continue
+        for _ in range(warmup):
+            path = reverse(f'posts:{pattern.name}', kwargs=kwargs)
+            request(handler, path, samples.query(query), cookie)
+        latencies = []
+        queries = []
+        statuses = {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            path = reverse(
+                f'posts:{pattern.name}', kwargs=samples.kwargs(pattern)
+            )
+            query_string = samples.query(query)
+            with count_queries() as counter:
+                begin = time.perf_counter()
+                status = request(handler, path, query_string, cookie)
+                latencies.append((time.perf_counter() - begin) * 1000)
+            queries.append(counter[0])
+            statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            'requests': requests,
+            'statuses': {str(code): total for code, total in statuses.items()},
+            **{
+                f'p{percent}_ms': round(percentile(latencies, percent), 3)
+                for percent in PERCENTILES
+            },
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+            'throughput_rps': round(requests / elapsed, 1),
+        }
+        if progress is not None:
+            progress(name, results[name])
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'user': user.get_username() if user else None,
+            'requests': requests,
+            'seed': seed,
+            'rows': {
+                model._meta.model_name: model.objects.count()
+                for model in (User, Group, Post, Comment, Follow)
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, metric='p95_ms', threshold=0.2):
+    """Сценарии, где metric вырос больше чем на threshold.
+
+    Возвращает список (сценарий, было, стало).
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name, {}).get(metric)
+        after = result.get(metric)
+        if before and after is not None and after > before * (1 + threshold):
+            regressions.append((name, before, after))
+    return regressions
@@ -0,0 +1,186 @@
+"""Поколенческий кеш страниц лент.
+
+Каждая лента зависит от набора областей (scope): 'posts' для всех
+постов, 'group:<slug>' для группы, 'author:<username>' для автора,
+'comments' для всех комментариев: от него зависят списки постов API,
+которые отдают comments_count, а HTML-ленты числа комментариев не
+показывают и не сбрасываются на каждый комментарий.
+У каждой области есть номер поколения, который входит в ключ кеша
+страницы. Сигналы сохранения и удаления моделей увеличивают поколение
+затронутых областей, и старые страницы просто перестают находиться,
+поэтому время жизни страниц может быть долгим.
+
+Поколение — это время смены в наносекундах, поэтому по поколениям
+страницы conditional_feed строит ETag и Last-Modified и отвечает
+304 Not Modified, не выполняя представление.
+"""
+import hashlib
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+from core import metrics
+
+GENERATION_KEY = 'generation:{}'
+
+# Счётчики попаданий и промахов кеша в этом процессе: ключи вида
+# 'feed.hit', 'post_fragment.miss'
+stats = Counter()
+
+
+def record(name, hit):
+    stats[f'{name}.hit' if hit else f'{name}.miss'] += 1
+    metrics.record_cache(name, hit)
+
+
+def generation_timeout():
+    """Время жизни поколений: без срока только в общем кеше.
+
+    LocMemCache у каждого процесса свой, и bump в одном процессе не
+    виден остальным. Короткий срок ограничивает, насколько долго они
+    отдают устаревшие страницы и ETag.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return settings.POSTS_LOCAL_GENERATION_SECONDS
+    return None
+
+
+def get_generations(*scopes):
+    """Вернуть словарь {область: поколение}, заводя недостающие"""
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            if not cache.add(key, value, timeout=generation_timeout()):
+                value = cache.get(key, value)
+            found[key] = value
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump(*scopes):
+    """Сменить поколение областей, сделав их кеш недействительным"""
+    keys = [GENERATION_KEY.format(scope) for scope in set(scopes)]
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys},
+        timeout=generation_timeout(),
+    )
+
+
+def post_scopes(post):
+    """Области, чьи страницы показывают пост"""
+    scopes = [
+        'posts',
+        f'post:{post.pk}',
+        f'author:{post.author.get_username()}',
+    ]
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    old_group = getattr(post, '_old_group', None)
+    if old_group is not None and old_group[1] is not None:
+        scopes.append(f'group:{old_group[1]}')
+    return scopes
+
+
+def cached_count(scope, queryset, timeout=None):
+    """Число строк queryset, пересчитываемое раз на поколение области"""
+    generation = get_generations(scope)[scope]
+    return cache.get_or_set(
+        f'count:{scope}:{generation}', queryset.count, timeout
+    )
+
+
+def cache_feed(*scope_templates, timeout):
+    """Кешировать GET-ответ представления до смены поколения областей.
+
+    Шаблоны областей форматируются аргументами из URL, например
+    'group:{slug}'. Ответ кешируется отдельно для каждого пользователя,
+    потому что шапка страницы зависит от него.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = get_generations(
+                *(template.format(**kwargs) for template in scope_templates)
+            )
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = 'feed:{}:{}:{}:{}'.format(
+                view.__name__,
+                '.'.join(str(generations[scope]) for scope in sorted(
+                    generations
+                )),
+                request.user.pk or 0,
+                path,
+            )
+            response = cache.get(key)
+            record('feed', response is not None)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                if hasattr(response, 'render'):
+                    response.render()
+                cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_feed(*scope_templates, scopes=None):
+    """Отвечать 304 Not Modified, пока поколения областей не сменились.
+
+    ETag собирается из поколений областей и пользователя, Last-Modified —
+    время последней смены поколения. Если заголовки запроса совпадают,
+    представление не вызывается. scopes(**kwargs) может вернуть
+    дополнительные области, которые нельзя вывести из URL.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = [template.format(**kwargs) for template in scope_templates]
+            if scopes is not None:
+                names.extend(scopes(**kwargs))
+            generations = get_generations(*names)
+            # Содержимое зависит от пользователя, а токен CSRF в формах
+            # меняется при каждой отрисовке, поэтому ETag слабый
+            etag = 'W/' + quote_etag(hashlib.md5('{}:{}:{}'.format(
+                view.__name__,
+                '.'.join(
+                    f'{scope}={generations[scope]}'
+                    for scope in sorted(generations)
+                ),
+                request.user.pk or 0,
+            ).encode()).hexdigest())
+            # Поколения в наносекундах, Last-Modified — в секундах
+            last_modified = max(generations.values()) // 10 ** 9
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            record('conditional', response is not None)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(response, no_cache=True)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,89 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 в той же
+транзакции, что и создание или удаление строки. Если счётчик разошёлся
+с данными, его пересчитывает команда recount_counters.
+"""
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+# Счётчик AuthorStats -> (модель, поле со ссылкой на пользователя)
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку"""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _add(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_author(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if _add(stats, field, delta):
+        return
+    # Без строки счётчиков уменьшать нечего: при каскадном удалении
+    # пользователя его AuthorStats уже удалены, и создавать их заново
+    # нельзя. Недостающие строки создаст recount_counters.
+    if delta < 0 and not stats.exists():
+        return
+    recount_authors(User.objects.filter(pk=user_id))
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_post(post_id, delta):
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def recount_authors(users):
+    """Создать недостающие AuthorStats и пересчитать их по данным"""
+    user_ids = users.values_list('pk', flat=True).iterator()
+    while True:
+        batch = list(islice(user_ids, BATCH_SIZE))
+        if not batch:
+            break
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=user_id) for user_id in batch],
+            ignore_conflicts=True,
+        )
+    return AuthorStats.objects.filter(user__in=users).update(**{
+        name: _count(model, field)
+        for name, (model, field) in AUTHOR_COUNTERS.items()
+    })
+
+
+def recount_all():
+    """Пересчитать все счётчики; вернуть число обновлённых строк"""
+    return {
+        'groups': Group.objects.update(posts_count=_count(Post, 'group')),
+        'posts': Post.objects.update(
+            comments_count=_count(Comment, 'post')
+        ),
+        'authors': recount_authors(User.objects.all()),
+    }
@@ -0,0 +1,172 @@
+"""Генерация синтетических данных для нагрузочных замеров.
+
+Распределения неравномерные, как в живом сообществе: число постов и
+подписчиков у авторов и популярность групп подчиняются закону Ципфа,
+комментарии чаще достаются свежим постам, у части постов есть
+картинки из небольшого общего набора. Записи пишутся через
+posts.importer, поэтому генерация миллионов строк не требует памяти
+больше, чем списки идентификаторов пользователей и постов.
+"""
+import random
+from array import array
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from . import importer
+from .models import Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'утро', 'город', 'река', 'книга', 'дорога', 'письмо', 'поезд', 'море',
+    'лес', 'окно', 'песня', 'зима', 'друг', 'вечер', 'кофе', 'снег',
+    'лето', 'память', 'небо', 'дом', 'свет', 'тишина', 'ветер', 'сад',
+)
+# Показатель закона Ципфа: чем больше, тем сильнее перекос
+ZIPF_EXPONENT = 1.1
+# Сколько случайных значений выбирать за раз
+DRAW_SIZE = 1000
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """Накопленные веса рангов 1..count по закону Ципфа"""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def weighted(rng, ids, cum_weights):
+    """Бесконечный поток идентификаторов с заданными весами"""
+    while True:
+        yield from rng.choices(ids, cum_weights=cum_weights, k=DRAW_SIZE)
+
+
+def text(rng, mean_words=30):
+    length = max(1, int(rng.lognormvariate(0, 0.8) * mean_words))
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def moment(rng, days):
+    return timezone.now() - timedelta(seconds=rng.uniform(0, days * 86400))
+
+
+def _new_ids(model, after):
+    return array('q', model.objects.filter(pk__gt=after).order_by(
+        'pk'
+    ).values_list('pk', flat=True).iterator())
+
+
+def _last_pk(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return last or 0
+
+
+def make_images(rng, count):
+    """Сохранить count разных картинок и вернуть их имена"""
+    storage = Post._meta.get_field('image').storage
+    names = []
+    for number in range(count):
+        size = (rng.randint(600, 1600), rng.randint(400, 1200))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG', quality=80)
+        names.append(storage.save(
+            f'posts/dataset-{number}.jpg', ContentFile(buffer.getvalue())
+        ))
+    return names
+
+
+def generate(users, groups, posts, comments, follows, images=0,
+             image_ratio=0.1, group_ratio=0.7, days=365, prefix='user',
+             seed=None, progress=None, stdout=None):
+    """Создать данные и вернуть {цель: (импортировано, пропущено)}.
+
+    progress(цель, импортировано, пропущено) вызывается по мере записи.
+    """
+    rng = random.Random(seed)
+    result = {}
+
+    def load(name, rows):
+        imported, skipped, _ = importer.import_rows(
+            name, rows,
+            skip_existing=True,
+            progress=progress and (
+                lambda done, failed: progress(name, done, failed)
+            ),
+        )
+        result[name] = (imported, skipped)
+
+    last_user = _last_pk(User)
+    load('users', (
+        {'username': f'{prefix}{last_user + number}'}
+        for number in range(1, users + 1)
+    ))
+    user_ids = _new_ids(User, last_user)
+    last_group = _last_pk(Group)
+    load('groups', (
+        {
+            'title': f'Группа {last_group + number}',
+            'slug': f'group-{last_group + number}',
+            'description': text(rng, 10),
+        }
+        for number in range(1, groups + 1)
+    ))
+    group_ids = _new_ids(Group, last_group)
+    if not user_ids:
+        return result
+    # Ранги перемешаны, чтобы плодовитые авторы не шли подряд
+    authors = list(user_ids)
+    rng.shuffle(authors)
+    author_stream = weighted(rng, authors, zipf_weights(len(authors)))
+    group_stream = (
+        weighted(rng, list(group_ids), zipf_weights(len(group_ids)))
+        if group_ids else None
+    )
+    image_names = make_images(rng, images) if images else []
+
+    def post_rows():
+        for _ in range(posts):
+            row = {
+                'author_id': next(author_stream),
+                'text': text(rng),
+                'pub_date': moment(rng, days).isoformat(),
+            }
+            if group_stream and rng.random() < group_ratio:
+                row['group_id'] = next(group_stream)
+            if image_names and rng.random() < image_ratio:
+                row['image'] = rng.choice(image_names)
+            yield row
+
+    last_post = _last_pk(Post)
+    load('posts', post_rows())
+    post_ids = _new_ids(Post, last_post)
+
+    def comment_rows():
+        for _ in range(comments):
+            # Свежие посты (с большими pk) обсуждают чаще
+            index = int(len(post_ids) * (1 - rng.random() ** 3))
+            yield {
+                'post_id': post_ids[min(index, len(post_ids) - 1)],
+                'author_id': rng.choice(user_ids),
+                'text': text(rng, 12),
+                'created': moment(rng, days).isoformat(),
+            }
+
+    def follow_rows():
+        for _ in range(follows):
+            yield {
+                'user_id': rng.choice(user_ids),
+                'author_id': next(author_stream),
+            }
+
+    if post_ids:
+        load('comments', comment_rows())
+    load('follows', follow_rows())
+    importer.finalize(list(importer.TARGETS), stdout=stdout)
+    return result
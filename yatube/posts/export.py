@@ -0,0 +1,157 @@
+"""Потоковая выгрузка постов автора или группы.
+
+Посты читаются курсором базы пачками по CHUNK_SIZE через
+iterator(chunk_size=...) и сразу превращаются в строки JSONL или CSV,
+поэтому в памяти не держится ни queryset, ни весь файл. Формат строк
+совпадает с тем, что читает команда import_content posts.
+
+В архив ZIP, кроме файла с постами, можно положить и сами картинки:
+архив тоже пишется потоком, кусками по мере сжатия.
+"""
+import csv
+import json
+import zipfile
+
+from django.core.files.storage import default_storage
+
+from .models import Post
+
+CHUNK_SIZE = 2000
+# Размер куска, который отдаётся клиенту при записи архива
+ZIP_CHUNK_SIZE = 64 * 1024
+FILE_CHUNK_SIZE = 64 * 1024
+FIELDS = (
+    'id', 'text', 'pub_date', 'author', 'group', 'image', 'image_url',
+    'comments_count',
+)
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'zip': 'application/zip',
+}
+EXPORT_ORDERING = ('pub_date', 'pk')
+
+
+def posts_for(author=None, group=None):
+    """Посты автора или группы в порядке публикации"""
+    posts = Post.objects.all()
+    if author is not None:
+        posts = posts.filter(author=author)
+    if group is not None:
+        posts = posts.filter(group=group)
+    return posts.order_by(*EXPORT_ORDERING)
+
+
+def rows(posts, chunk_size=CHUNK_SIZE):
+    """Словари с полями FIELDS, по одному на пост"""
+    values = posts.values_list(
+        'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+        'image', 'comments_count',
+    )
+    for pk, text, pub_date, author, group, image, comments in (
+        values.iterator(chunk_size=chunk_size)
+    ):
+        yield {
+            'id': pk,
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'author': author,
+            'group': group or '',
+            'image': image or '',
+            'image_url': default_storage.url(image) if image else '',
+            'comments_count': comments,
+        }
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+WRITERS = {'jsonl': jsonl_lines, 'csv': csv_lines}
+
+
+def lines(posts, file_format):
+    """Строки выгрузки в формате jsonl или csv"""
+    return WRITERS[file_format](rows(posts))
+
+
+class _Pipe:
+    """Поток без перемотки, куда zipfile пишет архив.
+
+    Записанное копится до выдачи очередного куска генератором.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def zip_chunks(posts, file_format, name='posts', images=False):
+    """Архив ZIP с выгрузкой и, если images, с картинками постов"""
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(f'{name}.{file_format}', 'w') as data:
+            for line in lines(posts, file_format):
+                data.write(line.encode())
+                if len(pipe.buffer) >= ZIP_CHUNK_SIZE:
+                    yield pipe.take()
+        if images:
+            yield from _add_images(archive, pipe, posts)
+    yield pipe.take()
+
+
+def _add_images(archive, pipe, posts):
+    names = (
+        posts.exclude(image='').order_by('image').values_list(
+            'image', flat=True
+        ).distinct().iterator(chunk_size=CHUNK_SIZE)
+    )
+    for image in names:
+        if not default_storage.exists(image):
+            continue
+        # Картинки уже сжаты, повторно их сжимать незачем
+        with default_storage.open(image) as source, archive.open(
+            zipfile.ZipInfo(image), 'w'
+        ) as target:
+            for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b''):
+                target.write(chunk)
+                if len(pipe.buffer) >= ZIP_CHUNK_SIZE:
+                    yield pipe.take()
+
+
+def chunks(posts, file_format, compress=False, name='posts', images=False):
+    """Куски выгрузки в байтах: строки файла или архив"""
+    if compress or images:
+        return zip_chunks(posts, file_format, name, images)
+    return (line.encode() for line in lines(posts, file_format))
@@ -0,0 +1,162 @@
+"""RSS и Atom ленты сайта, групп и авторов.
+
+Каждая лента — это N последних постов, выбранных одним запросом по
+индексу (pub_date, id). Готовый XML кешируется до смены поколения
+областей, как HTML-ленты, а ETag и Last-Modified позволяют читателям
+лент получать 304 без выборки и отрисовки.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+
+from .cache import cache_feed, conditional_feed
+from .models import Group, Post
+from .utils import POST_ORDERING
+
+FEED_ITEMS = 20
+FEED_SECONDS = 60 * 60 * 24
+TITLE_WORDS = 8
+FEED_TYPES = {
+    'rss': Rss201rev2Feed,
+    'atom': Atom1Feed,
+}
+
+User = get_user_model()
+
+
+class FeedKindConverter:
+    """Тип ленты в адресе: rss или atom"""
+    regex = '|'.join(FEED_TYPES)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+class PostsFeed(Feed):
+    """Последние посты сайта"""
+    title = 'Yatube: последние посты'
+    description = 'Новые посты всех авторов'
+
+    def __init__(self, kind):
+        self.feed_type = FEED_TYPES[kind]
+        self.kind = kind
+
+    def link(self, obj=None):
+        return reverse('posts:index')
+
+    def feed_url(self, obj=None):
+        return reverse('posts:index_feed', args=[self.kind])
+
+    def subtitle(self, obj=None):
+        return self.description
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj=None):
+        return self.posts(obj).select_related('author', 'group').order_by(
+            *POST_ORDERING
+        )[:FEED_ITEMS]
+
+    def item_title(self, post):
+        return Truncator(post.text).words(TITLE_WORDS)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.get_username()
+
+    def item_author_link(self, post):
+        return reverse('posts:profile', args=[post.author.get_username()])
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group_id else []
+
+
+class GroupFeed(PostsFeed):
+    """Последние посты группы"""
+
+    def get_object(self, request, slug, **kwargs):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def subtitle(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=[group.slug])
+
+    def feed_url(self, group):
+        return reverse('posts:group_feed', args=[group.slug, self.kind])
+
+    def posts(self, group):
+        return Post.objects.filter(group=group)
+
+
+class AuthorFeed(PostsFeed):
+    """Последние посты автора"""
+
+    def get_object(self, request, username, **kwargs):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.get_username()}'
+
+    def description(self, author):
+        return f'Новые посты автора {author.get_username()}'
+
+    subtitle = description
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.get_username()])
+
+    def feed_url(self, author):
+        return reverse(
+            'posts:profile_feed', args=[author.get_username(), self.kind]
+        )
+
+    def posts(self, author):
+        return Post.objects.filter(author=author)
+
+
+def _feed(feed_class, request, kind, **kwargs):
+    return feed_class(kind)(request, **kwargs)
+
+
+@conditional_feed('posts', 'groups', 'users')
+@cache_feed('posts', 'groups', 'users', timeout=FEED_SECONDS)
+def index_feed(request, kind):
+    """Лента последних постов сайта"""
+    return _feed(PostsFeed, request, kind)
+
+
+@conditional_feed('group:{slug}', 'groups', 'users')
+@cache_feed('group:{slug}', 'groups', 'users', timeout=FEED_SECONDS)
+def group_feed(request, slug, kind):
+    """Лента последних постов группы"""
+    return _feed(GroupFeed, request, kind, slug=slug)
+
+
+@conditional_feed('author:{username}', 'groups', 'users')
+@cache_feed('author:{username}', 'groups', 'users', timeout=FEED_SECONDS)
+def profile_feed(request, username, kind):
+    """Лента последних постов автора"""
+    return _feed(AuthorFeed, request, kind, username=username)
@@ -1,11 +1,52 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+
 from .models import Post, Comment
 
 
+class PostImageField(forms.ImageField):
+    """ImageField, который отклоняет большие файлы до декодирования.
+
+    Размер файла и размеры картинки проверяются по заголовку, и только
+    потом Pillow проверяет файл целиком.
+    """
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return super().to_python(data)
+        if data.size > settings.POSTS_IMAGE_MAX_UPLOAD_SIZE:
+            raise ValidationError(
+                'Файл слишком большой (максимум %(limit)s)',
+                code='file_too_large',
+                params={'limit': filesizeformat(
+                    settings.POSTS_IMAGE_MAX_UPLOAD_SIZE
+                )},
+            )
+        from PIL import Image
+
+        try:
+            with Image.open(data) as image:
+                width, height = image.size
+        except Exception:
+            width = height = 0
+        finally:
+            data.seek(0)
+        if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая (%(width)s×%(height)s)',
+                code='image_too_large',
+                params={'width': width, 'height': height},
+            )
+        return super().to_python(data)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
 
 
 class CommentForm(forms.ModelForm):
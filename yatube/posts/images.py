@@ -0,0 +1,137 @@
+"""Нормализация загруженных картинок постов в фоновом пуле.
+
+Картинка поворачивается по EXIF, теряет метаданные, уменьшается до
+POSTS_IMAGE_MAX_DIMENSION по большей стороне и пережимается. Обработка
+идёт в пуле posts.tasks, поэтому время запроса не зависит от размера
+загрузки; после неё готовятся миниатюры.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import cache, tasks, thumbnails
+from .models import Post
+
+KEEP_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def _needs_processing(image):
+    if getattr(image, 'is_animated', False):
+        return False
+    return (
+        image.format not in KEEP_FORMATS
+        or max(image.size) > settings.POSTS_IMAGE_MAX_DIMENSION
+        or bool(image.info.get('exif'))
+        or bool(image.getexif())
+    )
+
+
+def _encode(image):
+    """Пережать картинку; вернуть (байты, расширение)"""
+    image = ImageOps.exif_transpose(image)
+    limit = settings.POSTS_IMAGE_MAX_DIMENSION
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    buffer = BytesIO()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    image.convert('RGB').save(
+        buffer,
+        'JPEG',
+        quality=settings.POSTS_IMAGE_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return buffer.getvalue(), 'jpg'
+
+
+def normalize(post_id):
+    """Нормализовать картинку поста; вернуть True, если она изменилась"""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return False
+    old_name = post.image.name
+    storage = post.image.storage
+    with storage.open(old_name) as source:
+        with Image.open(source) as image:
+            if not _needs_processing(image):
+                return False
+            content, extension = _encode(image)
+    stem = os.path.splitext(os.path.basename(old_name))[0]
+    new_name = storage.save(
+        post.image.field.generate_filename(post, f'{stem}.{extension}'),
+        ContentFile(content),
+    )
+    if new_name == old_name:
+        return False
+    updated = Post.objects.filter(pk=post_id, image=old_name).update(
+        image=new_name
+    )
+    if not updated:
+        # Пока картинка обрабатывалась, пост успели изменить
+        release(new_name)
+        return False
+    restore(new_name, ContentFile(content), storage)
+    # update обходит сигналы, а кеш страниц ссылается на старый файл
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is not None:
+        cache.bump(*cache.post_scopes(post))
+    release(old_name)
+    return True
+
+
+def release(name, storage=None):
+    """Удалить файл картинки и его миниатюры, если на него нет ссылок.
+
+    Хранилище называет файлы по содержимому, поэтому один файл может
+    принадлежать нескольким постам. Проверка ссылок и удаление идут в
+    одной транзакции. Бэкенд core.db.sqlite3 начинает её с BEGIN
+    IMMEDIATE, то есть с блокировки записи во всю базу, поэтому пост со
+    ссылкой на этот файл сохраняется либо до проверки, либо после
+    удаления, и тогда файл возвращает restore. Это держится только на
+    таком бэкенде: в СУБД, где пишущие транзакции не исключают друг
+    друга, проверка не видит незафиксированный пост, а select_for_update
+    не может заблокировать ещё не существующие строки.
+    """
+    if not name:
+        return False
+    storage = storage or Post._meta.get_field('image').storage
+    with transaction.atomic():
+        if Post.objects.filter(image=name).exists():
+            return False
+        default.kvstore.delete(ImageFile(name, storage))
+        storage.delete(name)
+    return True
+
+
+def restore(name, content, storage=None):
+    """Вернуть файл, который release удалил до записи ссылки на него.
+
+    Вызывается, когда ссылка на name уже записана в базу.
+    """
+    if not name or content is None:
+        return False
+    storage = storage or Post._meta.get_field('image').storage
+    return storage.restore(name, content)
+
+
+def release_on_commit(name):
+    transaction.on_commit(lambda: release(name))
+
+
+def process_upload(post_id):
+    normalize(post_id)
+    thumbnails.generate(post_id)
+
+
+def schedule(post_id):
+    """Поставить обработку новой картинки поста в фоновый пул"""
+    tasks.submit(process_upload, post_id)
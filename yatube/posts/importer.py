@@ -0,0 +1,319 @@
+"""Потоковый импорт пользователей, групп, постов, комментариев и подписок.
+
+Записи читаются из JSONL или CSV по одной и пишутся пачками через
+bulk_create; пачки объединяются в транзакции по BATCHES_PER_TRANSACTION.
+В памяти держится только текущая пачка, поэтому расход памяти не
+зависит от размера файла. Ссылки задаются либо идентификатором
+(author_id, group_id, post_id, user_id), либо естественным ключом
+(author и user — имя пользователя, group — slug), который разрешается
+одним запросом на пачку.
+
+bulk_create не вызывает сигналы, поэтому счётчики, ленты подписок и
+кеш страниц после импорта нужно обновить: см. finalize.
+"""
+import csv
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, models, reset_queries, transaction
+from django.utils import timezone
+
+from . import counters, search
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+BATCHES_PER_TRANSACTION = 10
+# Сколько сообщений о пропущенных записях хранить для отчёта
+MAX_ERRORS = 20
+
+Target = namedtuple('Target', 'model fields references')
+
+TARGETS = {
+    'users': Target(
+        User,
+        ('id', 'username', 'first_name', 'last_name', 'email', 'password',
+         'is_active', 'date_joined'),
+        {},
+    ),
+    'groups': Target(Group, ('id', 'title', 'slug', 'description'), {}),
+    'posts': Target(
+        Post,
+        ('id', 'text', 'pub_date', 'image'),
+        {'author': (User, 'username'), 'group': (Group, 'slug')},
+    ),
+    'comments': Target(
+        Comment,
+        ('id', 'text', 'created'),
+        {'post': (Post, 'pk'), 'author': (User, 'username')},
+    ),
+    'follows': Target(
+        Follow, (), {'user': (User, 'username'), 'author': (User, 'username')}
+    ),
+}
+
+
+class InvalidRow(Exception):
+    """Запись нельзя импортировать"""
+
+
+def read_jsonl(file):
+    """Записи JSONL; вместо испорченной строки отдаётся InvalidRow"""
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield InvalidRow(f'некорректный JSON: {error}')
+        else:
+            if isinstance(row, dict):
+                yield row
+            else:
+                yield InvalidRow('запись должна быть объектом JSON')
+
+
+def read_csv(file):
+    """Записи CSV; вместо испорченной строки отдаётся InvalidRow"""
+    reader = csv.DictReader(file)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield InvalidRow(f'некорректный CSV: {error}')
+        else:
+            yield row
+
+
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
+
+
+def _convert(field, value):
+    if value == '' and field.null:
+        return None
+    value = field.to_python(value)
+    if isinstance(field, models.DateTimeField) and timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
+def _resolve(target, rows):
+    """Заменить естественные ключи ссылок пачки на идентификаторы"""
+    resolved = {}
+    for name, (model, key) in target.references.items():
+        if key == 'pk':
+            continue
+        wanted = {
+            row[name] for row in rows
+            if isinstance(row, dict) and row.get(name)
+        }
+        if wanted:
+            resolved[name] = dict(
+                model.objects.filter(**{f'{key}__in': wanted})
+                .values_list(key, 'pk')
+            )
+    return resolved
+
+
+def _build(target, row, resolved, date_fields):
+    if isinstance(row, InvalidRow):
+        raise row
+    model = target.model
+    values = {}
+    for name in target.fields:
+        if row.get(name) in (None, '') and name != 'password':
+            continue
+        field = model._meta.get_field(name)
+        try:
+            values[name] = _convert(field, row.get(name))
+        except ValidationError as error:
+            raise InvalidRow(f'{name}: {error.messages[0]}')
+    for name, (_, key) in target.references.items():
+        field = model._meta.get_field(name)
+        value = row.get(field.attname)
+        if value in (None, '') and key == 'pk':
+            value = row.get(name)
+        if value in (None, '') and row.get(name) not in (None, ''):
+            value = resolved.get(name, {}).get(row[name])
+            if value is None:
+                raise InvalidRow(f'{name}: не найден {row[name]!r}')
+        if value in (None, ''):
+            if not field.null:
+                raise InvalidRow(f'{name}: не задан')
+            continue
+        values[field.attname] = int(value)
+    if model is User:
+        if not values.get('username'):
+            raise InvalidRow('username: не задан')
+        values['password'] = values.get('password') or make_password(None)
+    if model is Follow and values['user_id'] == values['author_id']:
+        raise InvalidRow('нельзя подписаться на себя')
+    for field in date_fields:
+        values.setdefault(field.attname, timezone.now())
+    return model(**values)
+
+
+def _unique_keys(model):
+    """Наборы полей (attname), значения которых в таблице уникальны"""
+    meta = model._meta
+    keys = [(field.attname,) for field in meta.concrete_fields if field.unique]
+    keys.extend(meta.unique_together)
+    keys.extend(
+        constraint.fields for constraint in meta.constraints
+        if isinstance(constraint, models.UniqueConstraint)
+        and constraint.condition is None
+    )
+    return [
+        tuple(meta.get_field(name).attname for name in key) for key in keys
+    ]
+
+
+def _fresh(model, objects):
+    """Отбросить объекты, ключи которых уже есть в базе или в пачке.
+
+    С ignore_conflicts СУБД молча отбрасывает такие строки, и длина пачки
+    завышала бы число вставленных. Занятые ключи выбираются одним
+    запросом по каждому уникальному ключу пачки, без прохода по таблице.
+    """
+    for key in _unique_keys(model):
+        values = [tuple(getattr(obj, name) for name in key) for obj in objects]
+        wanted = [value for value in values if None not in value]
+        if not wanted:
+            continue
+        taken = set(model.objects.filter(**{
+            f'{name}__in': {value[i] for value in wanted}
+            for i, name in enumerate(key)
+        }).values_list(*key))
+        fresh = []
+        for obj, value in zip(objects, values):
+            if None not in value:
+                if value in taken:
+                    continue
+                taken.add(value)
+            fresh.append(obj)
+        objects = fresh
+    return objects
+
+
+@contextmanager
+def _imported_dates(model):
+    """Не затирать даты из файла: auto_now_add отключается на время импорта"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield fields
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def deferred_indexes(model):
+    """Удалить составные индексы модели на время импорта и создать заново.
+
+    Так индексы строятся один раз по готовой таблице, а не обновляются
+    при вставке каждой строки.
+    """
+    indexes = list(model._meta.indexes)
+    with connection.schema_editor() as editor:
+        for index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(model, index)
+
+
+def import_rows(name, rows, batch_size=BATCH_SIZE, skip_existing=False,
+                progress=None):
+    """Импортировать записи; вернуть (импортировано, пропущено, ошибки).
+
+    С ignore_conflicts записи с ключами, которые уже есть в базе или
+    повторяются в файле, отбрасываются до вставки и считаются пропущенными.
+    progress(imported, skipped) вызывается после каждой транзакции.
+    """
+    target = TARGETS[name]
+    ignore_conflicts = skip_existing or target.model is Follow
+    rows = iter(rows)
+    imported = skipped = 0
+    errors = []
+    with _imported_dates(target.model) as date_fields:
+        while True:
+            with transaction.atomic():
+                written = 0
+                for _ in range(BATCHES_PER_TRANSACTION):
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    resolved = _resolve(target, batch)
+                    objects = []
+                    for number, row in enumerate(batch, imported + skipped):
+                        try:
+                            objects.append(
+                                _build(target, row, resolved, date_fields)
+                            )
+                        except (InvalidRow, TypeError, ValueError) as error:
+                            skipped += 1
+                            if len(errors) < MAX_ERRORS:
+                                errors.append(f'#{number + 1}: {error}')
+                    if ignore_conflicts:
+                        # Строки, которые уже есть в базе, пропускаются
+                        built = len(objects)
+                        objects = _fresh(target.model, objects)
+                        skipped += built - len(objects)
+                    # Размер одного INSERT ограничивает сама СУБД: Django
+                    # делит пачку на части по её лимиту параметров
+                    target.model.objects.bulk_create(
+                        objects, ignore_conflicts=ignore_conflicts
+                    )
+                    imported += len(objects)
+                    written += len(batch)
+                    # При DEBUG Django запоминает каждый запрос
+                    reset_queries()
+            if progress is not None:
+                progress(imported, skipped)
+            if written < batch_size * BATCHES_PER_TRANSACTION:
+                break
+    return imported, skipped, errors
+
+
+def finalize(names, stdout=None):
+    """Обновить то, что bulk_create не поддерживает сам.
+
+    Сбрасывает последовательности первичных ключей, пересчитывает
+    счётчики, пересобирает ленты подписок и поисковый индекс, обновляет
+    статистику планировщика и очищает кеш страниц.
+    """
+    models = [TARGETS[name].model for name in names]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    with transaction.atomic():
+        counters.recount_all()
+    if {'posts', 'follows'} & set(names):
+        call_command('rebuild_timelines', stdout=stdout)
+    if {'users', 'groups', 'posts'} & set(names):
+        with transaction.atomic():
+            search.get_backend().rebuild()
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    cache.clear()
@@ -0,0 +1,241 @@
+"""Хранилище метаданных миниатюр sorl с локальным LRU.
+
+Запрос метаданных идёт по цепочке: LRU в памяти процесса, кеш Django
+(THUMBNAIL_CACHE), постоянное хранилище. Постоянным хранилищем служит
+SQLite-файл POSTS_THUMBNAIL_KVSTORE_PATH или, если путь не задан,
+таблица sorl в основной базе. Найденное значение копируется в верхние
+уровни, поэтому на прогретом процессе поиск миниатюр страницы — это
+чтение словаря.
+
+Имена картинок зависят от содержимого, а имена миниатюр — от имени
+картинки и параметров, поэтому записи почти не меняются. Отсутствие
+записи в LRU не запоминается: его хранит только общий кеш, который
+обновляется при создании миниатюры в любом процессе.
+
+Удаление записей (release картинки, нормализация) меняет поколение
+области GENERATION_SCOPE в общем кеше. Процесс сверяет его не чаще раза
+в POSTS_THUMBNAIL_LRU_CHECK_SECONDS и при смене очищает свой LRU, так
+что другие процессы не отдают метаданные удалённых миниатюр дольше
+этого времени.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import cache as posts_cache
+
+# Отметка «записи нет» в кеше Django, чтобы не ходить в хранилище
+EMPTY_VALUE = '__empty__'
+# Область posts.cache, поколение которой меняется при удалении записей
+GENERATION_SCOPE = 'thumbnail_kv'
+
+
+class LRUCache:
+    """Потокобезопасный LRU со сроком жизни записей"""
+
+    def __init__(self, max_size, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.max_size:
+            return
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DatabaseStore:
+    """Записи в таблице sorl основной базы"""
+
+    def get(self, key):
+        return KVStoreModel.objects.filter(key=key).values_list(
+            'value', flat=True
+        ).first()
+
+    def set(self, key, value):
+        KVStoreModel.objects.update_or_create(
+            key=key, defaults={'value': value}
+        )
+
+    def delete(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+
+    def keys(self, prefix):
+        return list(KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True))
+
+
+class SQLiteStore:
+    """Записи в отдельном SQLite-файле, без обращений к основной базе"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS kvstore '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self.connection.execute(
+            'SELECT value FROM kvstore WHERE key = ?', [key]
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            [key, value],
+        )
+
+    def delete(self, *keys):
+        self.connection.executemany(
+            'DELETE FROM kvstore WHERE key = ?', [[key] for key in keys]
+        )
+
+    def keys(self, prefix):
+        # GLOB, в отличие от LIKE, чувствителен к регистру и пользуется
+        # первичным ключом; символы шаблона в префиксе экранируются
+        pattern = ''.join(
+            f'[{char}]' if char in '*?[' else char for char in prefix
+        )
+        return [row[0] for row in self.connection.execute(
+            'SELECT key FROM kvstore WHERE key GLOB ?', [pattern + '*']
+        )]
+
+
+class KVStore(KVStoreBase):
+    """KV-хранилище sorl: LRU процесса, кеш Django, постоянное хранилище"""
+
+    def __init__(self):
+        super().__init__()
+        self.local = LRUCache(
+            django_settings.POSTS_THUMBNAIL_LRU_SIZE,
+            django_settings.POSTS_THUMBNAIL_LRU_TIMEOUT,
+        )
+        path = django_settings.POSTS_THUMBNAIL_KVSTORE_PATH
+        self.persistent = SQLiteStore(path) if path else DatabaseStore()
+        self.generation = None
+        self.checked_at = None
+
+    @property
+    def cache(self):
+        try:
+            return caches[settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    def clear(self, delete_thumbnails=False):
+        prefix = settings.THUMBNAIL_KEY_PREFIX
+        keys = self._find_keys_raw(prefix)
+        if keys:
+            self._delete_raw(*keys)
+        self.local.clear()
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+
+    def _check_generation(self):
+        """Очистить LRU, если записи удаляли в другом процессе"""
+        now = time.monotonic()
+        interval = django_settings.POSTS_THUMBNAIL_LRU_CHECK_SECONDS
+        if self.checked_at is not None and now - self.checked_at < interval:
+            return self.generation
+        generation = posts_cache.get_generations(
+            GENERATION_SCOPE
+        )[GENERATION_SCOPE]
+        if generation != self.generation:
+            self.local.clear()
+            self.generation = generation
+        self.checked_at = now
+        return generation
+
+    def _get_raw(self, key):
+        generation = self._check_generation()
+        value = self.local.get(key)
+        posts_cache.record('thumbnail_kv', value is not None)
+        if value is not None:
+            return value
+        value = self.cache.get(key)
+        if value is None:
+            value = self.persistent.get(key)
+            self.cache.set(
+                key, EMPTY_VALUE if value is None else value,
+                settings.THUMBNAIL_CACHE_TIMEOUT,
+            )
+        if value is None or value == EMPTY_VALUE:
+            return None
+        # Пока значение читалось, LRU могли очистить: прочитанное до
+        # смены поколения может быть уже удалено
+        if generation == self.generation:
+            self.local.set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        self.persistent.set(key, value)
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        self.local.set(key, value)
+
+    def _delete_raw(self, *keys):
+        self.persistent.delete(*keys)
+        self.cache.delete_many(keys)
+        self.local.delete(*keys)
+        posts_cache.bump(GENERATION_SCOPE)
+
+    def _find_keys_raw(self, prefix):
+        return self.persistent.keys(prefix)
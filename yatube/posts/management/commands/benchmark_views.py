@@ -0,0 +1,81 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить задержку, число SQL-запросов и пропускную способность '
+        'страниц постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Число замеряемых запросов на сценарий',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Число запросов перед замером',
+        )
+        parser.add_argument('--seed', type=int)
+        parser.add_argument(
+            '--user',
+            help='От чьего имени запрашивать страницы; по умолчанию '
+                 'пользователь с наибольшим числом подписок',
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 при сравнении, доля',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+
+        def progress(name, result):
+            self.stdout.write(
+                f'{name:<20} p50 {result["p50_ms"]:>8.2f} мс  '
+                f'p95 {result["p95_ms"]:>8.2f} мс  '
+                f'p99 {result["p99_ms"]:>8.2f} мс  '
+                f'запросов {result["queries_mean"]:>6.1f}  '
+                f'{result["throughput_rps"]:>8.1f} запр./с'
+            )
+
+        report = benchmark.run(
+            requests=options['requests'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            user=user,
+            progress=progress,
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            regressions = benchmark.compare(
+                baseline, report, threshold=options['threshold']
+            )
+            for name, before, after in regressions:
+                self.stderr.write(
+                    f'{name}: p95 {before:.2f} → {after:.2f} мс'
+                )
+            if regressions:
+                raise CommandError(
+                    f'Замедлились сценарии: {len(regressions)}'
+                )
+        self.stdout.write(self.style.SUCCESS('Замер завершён'))
@@ -0,0 +1,82 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import cache, images
+from posts.models import Post
+from posts.storage import is_hashed_name
+
+BATCH_SIZE = 500
+
+
+def walk(storage, path):
+    """Все файлы каталога хранилища, включая вложенные"""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовать картинки постов по хешу содержимого, '
+        'объединив одинаковые файлы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-orphans', action='store_true',
+            help='Удалить файлы, на которые не ссылается ни один пост',
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        renamed = missing = 0
+        last_name = ''
+        while True:
+            names = list(
+                Post.objects.exclude(image='')
+                .filter(image__gt=last_name)
+                .order_by('image')
+                .values_list('image', flat=True)
+                .distinct()[:BATCH_SIZE]
+            )
+            if not names:
+                break
+            last_name = names[-1]
+            for name in names:
+                if is_hashed_name(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    continue
+                with storage.open(name) as content:
+                    new_name = storage.save(name, content)
+                posts = list(
+                    Post.objects.filter(image=name)
+                    .select_related('author', 'group')
+                )
+                Post.objects.filter(image=name).update(image=new_name)
+                # update обходит сигналы: страницы и фрагменты постов в
+                # кеше ссылаются на старый файл и его миниатюры
+                cache.bump(*{
+                    scope for post in posts
+                    for scope in cache.post_scopes(post)
+                })
+                images.release(name, storage)
+                renamed += 1
+        orphans = 0
+        if storage.exists(field.upload_to):
+            for name in walk(storage, field.upload_to):
+                if Post.objects.filter(image=name).exists():
+                    continue
+                orphans += 1
+                if options['delete_orphans']:
+                    images.release(name, storage)
+        self.stdout.write(self.style.SUCCESS(
+            f'Переименовано файлов: {renamed}, не найдено: {missing}, '
+            f'без ссылок: {orphans}'
+            + (' (удалены)' if options['delete_orphans'] else '')
+        ))
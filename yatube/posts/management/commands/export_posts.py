@@ -0,0 +1,63 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить все посты автора или группы в JSONL, CSV или ZIP'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--author', help='Имя пользователя')
+        source.add_argument('--group', help='slug группы')
+        parser.add_argument(
+            '--format', choices=list(export.WRITERS), default='jsonl'
+        )
+        parser.add_argument(
+            '--zip', action='store_true', help='Упаковать выгрузку в ZIP'
+        )
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Положить в ZIP картинки постов',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл; «-» — стандартный вывод',
+        )
+
+    def handle(self, *args, **options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]}')
+            posts = export.posts_for(author=author)
+            name = f'{options["author"]}-posts'
+        elif options['group']:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+            posts = export.posts_for(group=group)
+            name = f'{options["group"]}-posts'
+        else:
+            raise CommandError('Укажите --author или --group')
+        chunks = export.chunks(
+            posts, options['format'], options['zip'], name, options['images']
+        )
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        try:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as error:
+            raise CommandError(error)
+        self.stderr.write(f'Выгрузка записана в {options["output"]}')
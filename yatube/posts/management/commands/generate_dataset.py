@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import dataset
+
+DEFAULTS = {
+    'users': 1000,
+    'groups': 20,
+    'posts': 20000,
+    'comments': 50000,
+    'follows': 30000,
+}
+
+
+class Command(BaseCommand):
+    help = 'Создать синтетические данные с неравномерными распределениями'
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULTS.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument(
+            '--scale', type=float, default=1,
+            help='Множитель для всех количеств',
+        )
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Число разных картинок, общих для постов',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты публикации',
+        )
+        parser.add_argument('--prefix', default='user')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(name, imported, skipped):
+            self.stdout.write(f'{name}: {imported}, пропущено {skipped}')
+
+        result = dataset.generate(
+            **{
+                name: int(options[name] * options['scale'])
+                for name in DEFAULTS
+            },
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            days=options['days'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            progress=progress,
+            stdout=self.stdout,
+        )
+        total = sum(imported for imported, _ in result.values())
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано записей: {total} за {elapsed:.1f} с. Варианты '
+            f'картинок создаёт команда generate_image_variants'
+        ))
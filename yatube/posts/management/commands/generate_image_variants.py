@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+def process(post, force):
+    close_old_connections()
+    try:
+        if force:
+            default.kvstore.delete_thumbnails(ImageFile(post.image))
+        elif thumbnails.ready_variants(post, schedule_missing=False):
+            return False
+        thumbnails.generate(post.pk)
+        return True
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Создать недостающие варианты картинок для существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков; 1 — обрабатывать посты в текущем потоке',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты, даже если они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('pk', 'image')
+        started = time.monotonic()
+        generated = 0
+        last_pk = 0
+        executor = None
+        if options['workers'] > 1:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+        run = executor.map if executor else map
+        try:
+            while True:
+                # Каждая порция читается целиком, чтобы не держать курсор
+                # открытым, пока потоки пишут метаданные миниатюр
+                batch = list(
+                    posts.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                generated += sum(run(
+                    lambda post: process(post, options['force']), batch
+                ))
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано вариантов для постов: {generated} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортировать пользователей, группы, посты, комментарии или '
+        'подписки из JSONL или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=list(importer.TARGETS))
+        parser.add_argument('path', help='Файл; «-» — стандартный ввод')
+        parser.add_argument(
+            '--format', choices=list(importer.READERS),
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=importer.BATCH_SIZE,
+            help='Число записей, которые читаются и пишутся за раз',
+        )
+        parser.add_argument(
+            '--skip-existing', action='store_true',
+            help='Пропускать записи, которые уже есть в базе',
+        )
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Удалить составные индексы на время импорта',
+        )
+        parser.add_argument(
+            '--no-finalize', action='store_true',
+            help=(
+                'Не пересчитывать счётчики и ленты; удобно, если следом '
+                'импортируются другие файлы'
+            ),
+        )
+
+    def open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        try:
+            return open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(
+            options['path']
+        )[1].lstrip('.')
+        if file_format not in importer.READERS:
+            raise CommandError('Укажите формат файла: --format jsonl|csv')
+        started = time.monotonic()
+
+        def progress(imported, skipped):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{imported} записей, пропущено {skipped}, '
+                f'{imported / max(elapsed, 1e-9):.0f} записей/с'
+            )
+
+        with ExitStack() as stack:
+            file = stack.enter_context(self.open(options['path']))
+            if options['defer_indexes']:
+                stack.enter_context(importer.deferred_indexes(
+                    importer.TARGETS[options['target']].model
+                ))
+            imported, skipped, errors = importer.import_rows(
+                options['target'],
+                importer.READERS[file_format](file),
+                batch_size=options['batch_size'],
+                skip_existing=options['skip_existing'],
+                progress=progress,
+            )
+        for error in errors:
+            self.stderr.write(error)
+        elapsed = time.monotonic() - started
+        if not options['no_finalize']:
+            importer.finalize([options['target']], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {imported}, пропущено {skipped} '
+            f'за {elapsed:.1f} с '
+            f'({imported / max(elapsed, 1e-9):.0f} записей/с)'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересоздать поисковый индекс постов'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            search.get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс пересоздан за {time.monotonic() - started:.1f} с'
+        ))
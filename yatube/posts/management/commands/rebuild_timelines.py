@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать материализованные ленты подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            authors = Follow.objects.order_by().values_list(
+                'author_id', flat=True
+            ).distinct()
+            for author_id in authors.iterator():
+                if timeline.refresh_author(author_id):
+                    continue
+                timeline.backfill(
+                    author_id,
+                    Follow.objects.filter(author_id=author_id)
+                    .values_list('user_id', flat=True).iterator()
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Таблица FTS5 для posts.search.SQLiteFTSBackend"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+        'text, group_title, author_name, '
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO posts_search (posts_search, rank) "
+        "VALUES ('rank', 'bm25(1.0, 0.5, 0.5)')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, text, group_title, author_name) '
+        "SELECT post.id, post.text, COALESCE(grp.title, ''), "
+        "author.username || ' ' || author.first_name || ' ' "
+        '|| author.last_name '
+        'FROM posts_post AS post '
+        'JOIN auth_user AS author ON author.id = post.author_id '
+        'LEFT JOIN posts_group AS grp ON grp.id = post.group_id'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_content_hash_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,257 @@
+"""Полнотекстовый поиск по постам.
+
+Поиск идёт по тексту поста, названию группы и имени автора через
+бэкенд из POSTS_SEARCH_BACKEND. Основной бэкенд — таблица SQLite FTS5
+posts_search: обратный индекс, поэтому время поиска зависит от числа
+совпадений, а не от размера базы. DatabaseBackend работает на любой
+СУБД через LIKE и нужен там, где FTS5 нет.
+
+Индекс обновляется сигналами сохранения и удаления постов; правки групп
+и пользователей переиндексируют их посты в фоне.
+"""
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .utils import (
+    CursorPage, InvalidCursor, decode_cursor, encode_cursor
+)
+
+BATCH_SIZE = 500
+TABLE = 'posts_search'
+# Таблица создаётся миграцией 0015_post_search; bm25 в ней взвешивает
+# текст поста с весом 1, название группы и имя автора с весом 0.5
+MAX_TERMS = 10
+
+_backend = None
+
+
+def terms(query):
+    """Слова запроса в нижнем регистре, не больше MAX_TERMS"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def documents(post_ids):
+    """Строки (id, текст, группа, автор) для индексации"""
+    posts = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'text', 'group__title', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    for pk, text, group, username, first_name, last_name in posts:
+        author = ' '.join(filter(None, (username, first_name, last_name)))
+        yield pk, text, group or '', author
+
+
+def _batches(ids):
+    ids = iter(ids)
+    while True:
+        batch = list(islice(ids, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+class SearchBackend:
+    """Интерфейс бэкенда поиска.
+
+    search() возвращает пары (ключ, id поста), где ключ — список
+    значений, по которым упорядочена выдача; он попадает в курсор.
+    """
+
+    def index(self, post_ids):
+        """Добавить или обновить посты в индексе"""
+
+    def remove(self, post_ids):
+        """Удалить посты из индекса"""
+
+    def rebuild(self):
+        """Пересоздать индекс по всем постам"""
+
+    def search(self, query, limit, after=None, backwards=False):
+        raise NotImplementedError
+
+
+class DatabaseBackend(SearchBackend):
+    """Поиск через LIKE без отдельного индекса, свежие посты выше"""
+
+    def search(self, query, limit, after=None, backwards=False):
+        words = terms(query)
+        if not words:
+            return []
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(text__icontains=word)
+                | Q(group__title__icontains=word)
+                | Q(author__username__icontains=word)
+            )
+        posts = Post.objects.filter(condition)
+        if after is not None:
+            timestamp, pk = after
+            try:
+                timestamp = Post._meta.get_field('pub_date').to_python(
+                    timestamp
+                )
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(after)
+            if timestamp is None:
+                raise InvalidCursor(after)
+            key = Q(pub_date__lt=timestamp) | Q(pub_date=timestamp, pk__lt=pk)
+            if backwards:
+                key = (
+                    Q(pub_date__gt=timestamp)
+                    | Q(pub_date=timestamp, pk__gt=pk)
+                )
+            posts = posts.filter(key)
+        ordering = ('pub_date', 'pk') if backwards else ('-pub_date', '-pk')
+        rows = posts.order_by(*ordering).values_list('pub_date', 'pk')
+        return [
+            ([pub_date.isoformat(), pk], pk)
+            for pub_date, pk in rows[:limit]
+        ]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Обратный индекс SQLite FTS5 с ранжированием bm25"""
+
+    def index(self, post_ids):
+        with connection.cursor() as cursor:
+            for batch in _batches(post_ids):
+                self._delete(cursor, batch)
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} '
+                    '(rowid, text, group_title, author_name) '
+                    'VALUES (%s, %s, %s, %s)',
+                    list(documents(batch)),
+                )
+
+    def _delete(self, cursor, post_ids):
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [[pk] for pk in post_ids],
+        )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            for batch in _batches(post_ids):
+                self._delete(cursor, batch)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        self.index(
+            Post.objects.order_by('pk').values_list('pk', flat=True)
+            .iterator()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')"
+            )
+
+    def search(self, query, limit, after=None, backwards=False):
+        words = terms(query)
+        if not words:
+            return []
+        # Каждое слово — префикс в кавычках, поэтому синтаксис FTS5 в
+        # запросе пользователя не интерпретируется
+        match = ' '.join(f'"{word}"*' for word in words)
+        sql = f'SELECT rank, rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+        params = [match]
+        if after is not None:
+            rank, pk = after
+            if isinstance(rank, bool) or not isinstance(rank, (int, float)):
+                raise InvalidCursor(after)
+            sign = '<' if backwards else '>'
+            sql += (
+                f' AND (rank {sign} %s OR (rank = %s AND rowid {sign} %s))'
+            )
+            params += [rank, rank, pk]
+        direction = 'DESC' if backwards else 'ASC'
+        sql += f' ORDER BY rank {direction}, rowid {direction} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [([rank, pk], pk) for rank, pk in cursor.fetchall()]
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.POSTS_SEARCH_BACKEND)()
+    return _backend
+
+
+def index_posts(post_ids):
+    get_backend().index(post_ids)
+
+
+def index_group(group_id):
+    """Переиндексировать посты группы после смены её названия"""
+    index_posts(
+        Post.objects.filter(group_id=group_id)
+        .values_list('pk', flat=True).iterator()
+    )
+
+
+def index_author(user_id):
+    """Переиндексировать посты автора после смены его имени"""
+    index_posts(
+        Post.objects.filter(author_id=user_id)
+        .values_list('pk', flat=True).iterator()
+    )
+
+
+class SearchPaginator:
+    """Курсорная пагинация выдачи поиска.
+
+    Повторяет интерфейс utils.CursorPaginator: ключ курсора — значения
+    ранжирования бэкенда, поэтому следующая страница выбирается условием
+    по ключу, а не через OFFSET.
+    """
+
+    def __init__(self, query, per_page, backend=None):
+        self.query = query
+        self.per_page = int(per_page)
+        self.backend = backend or get_backend()
+
+    def page(self, cursor=None):
+        direction, after = (
+            decode_cursor(cursor) if cursor else ('next', None)
+        )
+        if after is not None and (
+            len(after) != 2
+            or isinstance(after[1], bool) or not isinstance(after[1], int)
+        ):
+            raise InvalidCursor(cursor)
+        backwards = direction == 'previous'
+        hits = self.backend.search(
+            self.query, self.per_page + 1, after, backwards
+        )
+        has_more = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        if backwards:
+            hits.reverse()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for _, pk in hits]
+        )
+        rows = [posts[pk] for _, pk in hits if pk in posts]
+        has_next = True if backwards else has_more
+        has_previous = has_more if backwards else after is not None
+        next_cursor = previous_cursor = None
+        if hits and has_next:
+            next_cursor = encode_cursor('next', hits[-1][0])
+        if hits and has_previous:
+            previous_cursor = encode_cursor('previous', hits[0][0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
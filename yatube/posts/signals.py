@@ -0,0 +1,130 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, counters, images, search, tasks, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Загрузку сохраняет поле уже после сигнала; её содержимое нужно,
+    # чтобы вернуть файл, если release удалит его до записи поста
+    instance._image_upload = None
+    if instance.image and not instance.image._committed and not raw:
+        instance._image_upload = instance.image.file
+    if instance.pk is not None and not raw:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'group__slug', 'image'
+        ).first()
+        if old is not None:
+            instance._old_group = old[:2]
+            instance._old_image = old[2]
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_author(instance.author_id, 'posts_count', 1)
+        counters.change_group(instance.group_id, 1)
+        timeline.post_published(instance)
+    else:
+        old_group = getattr(instance, '_old_group', None)
+        if old_group is not None and old_group[0] != instance.group_id:
+            counters.change_group(old_group[0], -1)
+            counters.change_group(instance.group_id, 1)
+    images.restore(
+        instance.image.name, getattr(instance, '_image_upload', None)
+    )
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image and (created or instance.image.name != old_image):
+        images.schedule(instance.pk)
+    if old_image and old_image != instance.image.name:
+        images.release_on_commit(old_image)
+    search.index_posts([instance.pk])
+    cache.bump(*cache.post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, -1)
+    timeline.post_removed(instance)
+    if instance.image:
+        images.release_on_commit(instance.image.name)
+    search.get_backend().remove([instance.pk])
+    cache.bump(*cache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_post(instance.post_id, 1)
+    cache.bump(f'post:{instance.post_id}', 'comments')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+    cache.bump(f'post:{instance.post_id}', 'comments')
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не будет ссылки на группу
+    instance._post_ids = list(
+        instance.group.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    cache.bump('groups')
+    if hasattr(instance, '_post_ids'):
+        tasks.submit(search.index_posts, instance._post_ids)
+    elif not created:
+        tasks.submit(search.index_group, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created or raw or update_fields == frozenset({'last_login'}):
+        return
+    cache.bump('users')
+    tasks.submit(search.index_author, instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    counters.change_author(instance.author_id, 'followers_count', 1)
+    counters.change_author(instance.user_id, 'following_count', 1)
+    timeline.follow_added(instance)
+    cache.bump(
+        f'author:{instance.author.get_username()}',
+        f'author:{instance.user.get_username()}',
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'followers_count', -1)
+    counters.change_author(instance.user_id, 'following_count', -1)
+    timeline.follow_removed(instance)
+    cache.bump(
+        f'author:{instance.author.get_username()}',
+        f'author:{instance.user.get_username()}',
+    )
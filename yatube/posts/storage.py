@@ -0,0 +1,61 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла, прочитанного по частям"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME.search(name))
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по хешу содержимого.
+
+    Одинаковые файлы получают одно имя и хранятся один раз, а миниатюры
+    sorl, привязанные к имени исходника, создаются для них тоже один раз.
+    Удалять файл можно только когда на него не ссылается ни один пост,
+    см. posts.images.release. Поэтому save может вернуть имя файла, который
+    удалят до того, как ссылка на него попадёт в базу; после записи ссылки
+    такой файл возвращает restore.
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def restore(self, name, content):
+        """Записать content под готовым хешированным именем, если файла нет"""
+        if self.exists(name):
+            return False
+        self._save(name, content)
+        return True
@@ -0,0 +1,47 @@
+"""Пул фоновых потоков для медленной работы вне цикла запроса."""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_WORKERS,
+                thread_name_prefix='posts-worker',
+            )
+    return _executor
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась с ошибкой', func)
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args):
+    """Выполнить func(*args) в пуле после фиксации текущей транзакции.
+
+    Если POSTS_WORKERS равно нулю, задача выполняется сразу в текущем
+    потоке (после фиксации транзакции).
+    """
+    if not settings.POSTS_WORKERS:
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args)
+    )
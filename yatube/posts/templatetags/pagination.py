@@ -0,0 +1,11 @@
+from django import template
+
+from posts import utils
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page, on_each_side=2):
+    """Номера страниц для ссылок пагинатора, пропуски обозначены None"""
+    return utils.page_window(page, on_each_side=on_each_side)
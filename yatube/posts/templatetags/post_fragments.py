@@ -0,0 +1,30 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import get_generations, record
+
+register = template.Library()
+
+FRAGMENT_SECONDS = 60 * 60 * 24
+
+
+@register.simple_tag
+def post_card(post):
+    """Отрисовать includes/post.html для поста через кеш фрагментов.
+
+    Ключ фрагмента включает поколения поста, групп и пользователей,
+    поэтому правка поста, его автора или группы сбрасывает фрагмент.
+    """
+    generations = get_generations(f'post:{post.pk}', 'groups', 'users')
+    key = 'post_fragment:{}:{}'.format(
+        post.pk,
+        '.'.join(str(generations[scope]) for scope in sorted(generations)),
+    )
+    html = cache.get(key)
+    record('post_fragment', html is not None)
+    if html is None:
+        html = render_to_string('includes/post.html', {'post': post})
+        cache.set(key, html, FRAGMENT_SECONDS)
+    return mark_safe(html)
@@ -1,16 +1,34 @@
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings
 
+from PIL import Image
+
+from posts import cache as post_cache
+from posts import images
+from posts.storage import ContentHashStorage, is_hashed_name
 from posts.models import Post, Group
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ORIENTATION_TAG = 0x0112
+storage = ContentHashStorage()
+
+
+def make_image(image_format, size, **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+    return buffer.getvalue()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -78,7 +96,7 @@ class PostCreateFormTest(TestCase):
                 text=post_form['text'],
                 group=post_form['group'],
                 author=PostCreateFormTest.user,
-                image='posts/test.gif'
+                image=storage.hashed_name('posts/test.gif', test_img)
             ).exists()
         )
 
@@ -113,3 +131,129 @@ class PostCreateFormTest(TestCase):
                 author=PostCreateFormTest.user
             ).exists()
         )
+
+    @override_settings(POSTS_IMAGE_MAX_UPLOAD_SIZE=16)
+    def test_create_post_rejects_large_file(self):
+        """Слишком большой файл отклоняется до открытия картинки"""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с большой картинкой',
+                'image': SimpleUploadedFile(
+                    name='big.gif',
+                    content=make_image('GIF', (64, 64)),
+                    content_type='image/gif'
+                ),
+            }
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertIn(
+            'Файл слишком большой', response.context['form'].errors['image'][0]
+        )
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_create_post_rejects_large_dimensions(self):
+        """Картинка с огромными размерами отклоняется по заголовку"""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с огромной картинкой',
+                'image': SimpleUploadedFile(
+                    name='wide.png',
+                    content=make_image('PNG', (20, 20)),
+                    content_type='image/png'
+                ),
+            }
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertIn('20×20', response.context['form'].errors['image'][0])
+
+    @override_settings(POSTS_IMAGE_MAX_DIMENSION=32)
+    def test_normalize_image(self):
+        """Картинка поста уменьшается, поворачивается и теряет EXIF"""
+        exif = Image.Exif()
+        exif[ORIENTATION_TAG] = 6
+        post = Post.objects.create(
+            author=PostCreateFormTest.user,
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(
+                name='photo.jpg',
+                content=make_image('JPEG', (100, 50), exif=exif),
+                content_type='image/jpeg'
+            ),
+        )
+        before = post_cache.get_generations(f'post:{post.pk}')
+        self.assertTrue(images.normalize(post.pk))
+        self.assertNotEqual(
+            post_cache.get_generations(f'post:{post.pk}'), before
+        )
+        post.refresh_from_db()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (16, 32))
+            self.assertFalse(image.getexif())
+        self.assertFalse(images.normalize(post.pk))
+
+    def test_identical_images_share_file(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки"""
+        content = make_image('PNG', (4, 4))
+        first, second = [
+            Post.objects.create(
+                author=PostCreateFormTest.user,
+                text='Пост с общей картинкой',
+                image=SimpleUploadedFile(name=f'{name}.png', content=content),
+            )
+            for name in ('first', 'second')
+        ]
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        first.delete()
+        self.assertFalse(images.release(name))
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertTrue(images.release(name))
+        self.assertFalse(storage.exists(name))
+
+    def test_release_before_reference_restores_file(self):
+        """Файл, удалённый release до записи поста, возвращается"""
+        content = make_image('PNG', (5, 5))
+        name = storage.save('posts/old.png', ContentFile(content))
+        save = ContentHashStorage.save
+
+        def save_and_release(self, *args, **kwargs):
+            # release из другого процесса успевает между save и INSERT
+            result = save(self, *args, **kwargs)
+            images.release(result, self)
+            return result
+
+        with mock.patch.object(ContentHashStorage, 'save', save_and_release):
+            post = Post.objects.create(
+                author=PostCreateFormTest.user,
+                text='Пост с удалённой картинкой',
+                image=SimpleUploadedFile(name='new.png', content=content),
+            )
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertFalse(images.release(name))
+
+    def test_dedupe_media_renames_legacy_files(self):
+        """dedupe_media переводит старые имена на хеш содержимого"""
+        legacy = FileSystemStorage().save(
+            'posts/legacy.png', ContentFile(make_image('PNG', (3, 3)))
+        )
+        post = Post.objects.create(
+            author=PostCreateFormTest.user, text='Старый пост'
+        )
+        Post.objects.filter(pk=post.pk).update(image=legacy)
+        scopes = ('posts', f'post:{post.pk}', 'author:NoName')
+        before = post_cache.get_generations(*scopes)
+        call_command('dedupe_media', stdout=StringIO())
+        after = post_cache.get_generations(*scopes)
+        for scope in scopes:
+            with self.subTest(scope=scope):
+                self.assertNotEqual(after[scope], before[scope])
+        post.refresh_from_db()
+        self.assertTrue(is_hashed_name(post.image.name))
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertFalse(storage.exists(legacy))
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts import importer, search
+from posts.models import AuthorStats, Follow, Post, Group
+from posts.timeline import feed_for
+
+User = get_user_model()
+
+
+class ImportContentTest(TestCase):
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_import_content(self):
+        """import_content загружает записи и обновляет счётчики и ленты"""
+        files = [
+            ('users', self.write('users.jsonl', '\n'.join(
+                json.dumps({'username': name}) for name in ('leo', 'ann')
+            ))),
+            ('groups', self.write(
+                'groups.csv', 'title,slug,description\nПоэзия,poetry,Стихи\n'
+            )),
+            ('posts', self.write('posts.jsonl', '\n'.join(map(json.dumps, [
+                {'text': 'Первый', 'author': 'leo', 'group': 'poetry',
+                 'pub_date': '2020-01-01T10:00:00'},
+                {'text': 'Второй', 'author': 'leo'},
+                {'text': 'Без автора', 'author': 'nobody'},
+            ])))),
+            ('follows', self.write(
+                'follows.csv', 'user,author\nann,leo\nann,leo\nleo,leo\n'
+            )),
+        ]
+        for target, path in files:
+            call_command(
+                'import_content', target, path,
+                stdout=StringIO(), stderr=StringIO()
+            )
+        leo = User.objects.get(username='leo')
+        ann = User.objects.get(username='ann')
+        self.assertFalse(leo.has_usable_password())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            Post.objects.get(text='Первый').pub_date.year, 2020
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(AuthorStats.objects.get(user=leo).posts_count, 2)
+        self.assertEqual(Group.objects.get(slug='poetry').posts_count, 1)
+        self.assertEqual(feed_for(ann).count(), 2)
+        self.assertEqual(
+            [hit for _, hit in search.get_backend().search('первый', 10)],
+            [Post.objects.get(text='Первый').pk]
+        )
+
+    def test_import_reports_skipped_rows(self):
+        """Записи с ошибками пропускаются и попадают в отчёт"""
+        path = self.write('posts.jsonl', json.dumps({'text': 'Пост'}))
+        stderr = StringIO()
+        call_command(
+            'import_content', 'posts', path,
+            stdout=StringIO(), stderr=stderr
+        )
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertIn('author: не задан', stderr.getvalue())
+
+    def test_import_skips_malformed_lines(self):
+        """Испорченная строка JSONL пропускается, а не прерывает импорт"""
+        User.objects.create_user(username='leo')
+        path = self.write('posts.jsonl', '\n'.join([
+            json.dumps({'text': 'Первый', 'author': 'leo'}),
+            '{"text": "Обрыв',
+            '[1, 2]',
+            json.dumps({'text': 'Второй', 'author': 'leo'}),
+        ]))
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_content', 'posts', path, '--batch-size', '1',
+            stdout=stdout, stderr=stderr
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIn('#2: некорректный JSON', stderr.getvalue())
+        self.assertIn('#3: запись должна быть объектом', stderr.getvalue())
+        self.assertIn('Импортировано 2, пропущено 2', stdout.getvalue())
+
+    def test_import_counts_inserted_rows(self):
+        """Отброшенные при конфликте записи не считаются импортированными"""
+        leo = User.objects.create_user(username='leo')
+        ann = User.objects.create_user(username='ann')
+        Follow.objects.create(user=ann, author=leo)
+        rows = [{'user': 'ann', 'author': 'leo'}] * 2 + [
+            {'user': 'leo', 'author': 'ann'}
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            imported, skipped, errors = importer.import_rows('follows', rows)
+        self.assertEqual((imported, skipped, errors), (1, 2, []))
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_skip_existing_counts_inserted_rows(self):
+        """--skip-existing не считает существующие записи импортированными"""
+        Group.objects.create(title='Поэзия', slug='poetry')
+        rows = [
+            {'title': 'Поэзия', 'slug': 'poetry'},
+            {'title': 'Проза', 'slug': 'prose'},
+            {'title': 'Проза', 'slug': 'prose'},
+        ]
+        self.assertEqual(
+            importer.import_rows('groups', rows, skip_existing=True),
+            (1, 2, [])
+        )
+        self.assertEqual(Group.objects.count(), 2)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import cache as post_cache
+from posts import thumbnails
+from posts.kvstore import KVStore, LRUCache, SQLiteStore
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        """LRU вытесняет давно не читанные записи"""
+        lru = LRUCache(max_size=2)
+        lru.set('first', 1)
+        lru.set('second', 2)
+        lru.get('first')
+        lru.set('third', 3)
+        self.assertEqual(lru.get('first'), 1)
+        self.assertIsNone(lru.get('second'))
+        self.assertEqual(len(lru), 2)
+
+    def test_expires_entries(self):
+        """Записи LRU устаревают через timeout секунд"""
+        lru = LRUCache(max_size=2, timeout=-1)
+        lru.set('key', 'value')
+        self.assertIsNone(lru.get('key'))
+
+
+class SQLiteStoreTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.store = SQLiteStore(os.path.join(directory, 'kvstore.sqlite3'))
+
+    def test_roundtrip(self):
+        """SQLite-хранилище сохраняет, находит по префиксу и удаляет"""
+        self.store.set('sorl||image||a', '{"size": [1, 1]}')
+        self.store.set('sorl||image||b', '{}')
+        self.store.set('other||image||c', '{}')
+        self.assertEqual(self.store.get('sorl||image||a'), '{"size": [1, 1]}')
+        self.assertCountEqual(
+            self.store.keys('sorl||'), ['sorl||image||a', 'sorl||image||b']
+        )
+        self.store.delete('sorl||image||a')
+        self.assertIsNone(self.store.get('sorl||image||a'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class KVStoreTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(name='test.gif', content=SMALL_GIF),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.local.clear()
+
+    def test_warm_lookups_read_memory(self):
+        """Поиск готовых миниатюр на прогретом процессе не ходит в базу"""
+        thumbnails.generate(KVStoreTest.post.pk)
+        # Поколение записей остаётся в кеше, остальные записи — нет
+        kvstore = default.kvstore
+        kvstore.cache.delete_many(
+            kvstore._find_keys_raw(sorl_settings.THUMBNAIL_KEY_PREFIX)
+        )
+        misses = post_cache.stats['thumbnail_kv.miss']
+        with CaptureQueriesContext(connection) as queries:
+            ready = thumbnails.ready_variants(
+                KVStoreTest.post, schedule_missing=False
+            )
+        self.assertIsNotNone(ready)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(post_cache.stats['thumbnail_kv.miss'], misses)
+
+    def test_cold_lookups_fill_memory(self):
+        """Записи из постоянного хранилища попадают в LRU процесса"""
+        thumbnails.generate(KVStoreTest.post.pk)
+        cache.clear()
+        default.kvstore.local.clear()
+        thumbnails.ready_variants(KVStoreTest.post, schedule_missing=False)
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.ready_variants(
+                KVStoreTest.post, schedule_missing=False
+            )
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(POSTS_THUMBNAIL_LRU_CHECK_SECONDS=0)
+    def test_delete_in_other_process_clears_memory(self):
+        """Удалённые в другом процессе записи не отдаются из LRU"""
+        worker, other = KVStore(), KVStore()
+        other._set_raw('sorl||image||a', '{}')
+        self.assertEqual(worker._get_raw('sorl||image||a'), '{}')
+        other._delete_raw('sorl||image||a')
+        self.assertIsNone(worker._get_raw('sorl||image||a'))
@@ -1,7 +1,15 @@
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from posts.models import Post, Group
+from posts.models import AuthorStats, Comment, Follow, Post, Group
+from posts.timeline import FEED_ORDERING, feed_for
+from posts.utils import POST_ORDERING
+from posts.views import NUMBER_DISPLAY_POSTS
 
 User = get_user_model()
 
@@ -127,3 +135,165 @@ class GroupModelTest(TestCase):
                 self.assertEqual(
                     group._meta.get_field(field).help_text, expected_value
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, **expected):
+        author_stats = AuthorStats.objects.get(user=CountersTest.author)
+        reader_stats = AuthorStats.objects.get(user=CountersTest.reader)
+        actual = {
+            'posts': author_stats.posts_count,
+            'followers': author_stats.followers_count,
+            'following': reader_stats.following_count,
+            'group_posts': Group.objects.get(
+                pk=CountersTest.group.pk
+            ).posts_count,
+        }
+        self.assertEqual(actual, expected)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении записей"""
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост',
+            group=CountersTest.group,
+        )
+        comment = Comment.objects.create(
+            author=CountersTest.reader, post=post, text='Комментарий'
+        )
+        follow = Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author
+        )
+        self.assertCounters(posts=1, followers=1, following=1, group_posts=1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.group = None
+        post.save()
+        self.assertCounters(posts=1, followers=0, following=0, group_posts=0)
+        post.delete()
+        self.assertCounters(posts=0, followers=0, following=0, group_posts=0)
+
+    def test_delete_user_with_content(self):
+        """Удаление пользователя не создаёт заново его счётчики"""
+        user = User.objects.create_user(username='leaving')
+        post = Post.objects.create(
+            author=user, text='Пост', group=CountersTest.group
+        )
+        Comment.objects.create(author=user, post=post, text='Свой')
+        Comment.objects.create(
+            author=CountersTest.reader, post=post, text='Чужой'
+        )
+        Follow.objects.create(user=user, author=CountersTest.author)
+        Follow.objects.create(user=CountersTest.reader, author=user)
+        user.delete()
+        # Внешние ключи в SQLite проверяются при фиксации транзакции,
+        # а TestCase её откатывает, поэтому проверяем их явно
+        connection.check_constraints()
+        self.assertFalse(AuthorStats.objects.filter(user_id=user.pk).exists())
+        self.assertCounters(posts=0, followers=0, following=0, group_posts=0)
+
+    def test_recount_command_repairs_drift(self):
+        """Команда recount_counters исправляет разошедшиеся счётчики"""
+        Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост',
+            group=CountersTest.group,
+        )
+        Follow.objects.create(
+            user=CountersTest.reader, author=CountersTest.author
+        )
+        AuthorStats.objects.update(
+            posts_count=42, followers_count=42, following_count=42
+        )
+        Group.objects.update(posts_count=42)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters(posts=1, followers=1, following=1, group_posts=1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+class QueryPlanTest(TestCase):
+    """Запросы страниц используют составные индексы без сортировки"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index_name}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по составным индексам"""
+        cursor = {'pub_date__lt': QueryPlanTest.post.pub_date}
+        queries = {
+            'post_date_idx': Post.objects.all(),
+            'post_author_date_idx': Post.objects.filter(
+                author=QueryPlanTest.author
+            ),
+            'post_group_date_idx': Post.objects.filter(
+                group=QueryPlanTest.group
+            ),
+        }
+        for index_name, queryset in queries.items():
+            for filters in ({}, cursor):
+                with self.subTest(index=index_name, filters=filters):
+                    self.assertUsesIndex(
+                        queryset.filter(**filters).order_by(
+                            *POST_ORDERING
+                        )[:NUMBER_DISPLAY_POSTS + 1],
+                        index_name
+                    )
+
+    def test_follow_feed_uses_timeline_index(self):
+        """Лента подписок читается диапазоном индекса ленты"""
+        self.assertUsesIndex(
+            feed_for(QueryPlanTest.reader).order_by(
+                *FEED_ORDERING
+            )[:NUMBER_DISPLAY_POSTS + 1],
+            'timeline_user_date_post_idx'
+        )
+
+    def test_comments_use_index(self):
+        """Комментарии поста читаются по индексу (post, -created)"""
+        self.assertUsesIndex(
+            Comment.objects.filter(post=QueryPlanTest.post).order_by(
+                '-created', '-pk'
+            )[:NUMBER_DISPLAY_POSTS + 1],
+            'comment_post_created_idx'
+        )
+
+    def test_followers_use_covering_index(self):
+        """Подписчики автора читаются из покрывающего индекса"""
+        self.assertUsesIndex(
+            Follow.objects.filter(author=QueryPlanTest.author).values(
+                'user_id'
+            ),
+            'follow_author_user_idx'
+        )
@@ -0,0 +1,213 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.admin import EstimatedCountPaginator
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Потолок числа SQL-запросов для каждой страницы. Запросы сессии и
+# пользователя входят в бюджет, поэтому он не зависит от числа постов,
+# авторов, групп и комментариев на странице. Странице поста нужен ещё
+# запрос автора для ETag и Last-Modified (conditional_feed), порции
+# комментариев — проверка, что пост существует.
+QUERY_BUDGETS = {
+    'posts:index': 3,
+    'posts:group_list': 4,
+    'posts:profile': 5,
+    'posts:post_detail': 5,
+    'posts:comments': 2,
+    'posts:follow_index': 4,
+    'posts:post_edit': 4,
+    'posts:post_create': 3,
+}
+
+
+class ViewQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ViewQueryBudgetTest.user)
+        self.author_client = Client()
+        self.author_client.force_login(ViewQueryBudgetTest.author)
+        cache.clear()
+
+    def add_content(self, count):
+        """Добавить посты с разными авторами, группами и комментариями"""
+        for i in range(count):
+            author = User.objects.create_user(username=f'author-{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Описание',
+            )
+            Follow.objects.create(user=ViewQueryBudgetTest.user, author=author)
+            Post.objects.create(author=author, text=f'Пост {i}', group=group)
+            Post.objects.create(
+                author=ViewQueryBudgetTest.author,
+                text=f'Пост автора {i}',
+                group=ViewQueryBudgetTest.group,
+            )
+            Comment.objects.create(
+                post=ViewQueryBudgetTest.post,
+                author=author,
+                text=f'Комментарий {i}',
+            )
+
+    def pages(self):
+        return {
+            'posts:index': (self.authorized_client, {}),
+            'posts:group_list': (
+                self.authorized_client,
+                {'slug': ViewQueryBudgetTest.group.slug}
+            ),
+            'posts:profile': (
+                self.authorized_client,
+                {'username': ViewQueryBudgetTest.author.get_username()}
+            ),
+            'posts:post_detail': (
+                self.authorized_client,
+                {'post_id': ViewQueryBudgetTest.post.pk}
+            ),
+            'posts:comments': (
+                self.authorized_client,
+                {'post_id': ViewQueryBudgetTest.post.pk}
+            ),
+            'posts:follow_index': (self.authorized_client, {}),
+            'posts:post_edit': (
+                self.author_client,
+                {'post_id': ViewQueryBudgetTest.post.pk}
+            ),
+            'posts:post_create': (self.authorized_client, {}),
+        }
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        return len(queries)
+
+    def test_views_fit_query_budget(self):
+        """Каждая страница укладывается в бюджет запросов"""
+        self.add_content(5)
+        for name, (client, kwargs) in self.pages().items():
+            with self.subTest(name=name):
+                self.assertLessEqual(
+                    self.count_queries(client, reverse(name, kwargs=kwargs)),
+                    QUERY_BUDGETS[name]
+                )
+
+    def test_queries_do_not_grow_with_content(self):
+        """Число запросов не зависит от количества записей на странице"""
+        before = {
+            name: self.count_queries(client, reverse(name, kwargs=kwargs))
+            for name, (client, kwargs) in self.pages().items()
+        }
+        self.add_content(5)
+        for name, (client, kwargs) in self.pages().items():
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.count_queries(client, reverse(name, kwargs=kwargs)),
+                    before[name]
+                )
+
+
+class AdminQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.client.force_login(AdminQueryBudgetTest.admin)
+        cache.clear()
+
+    def add_content(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'author-{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='Описание'
+            )
+            post = Post.objects.create(
+                author=author, text=f'Пост {i}', group=group
+            )
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(
+                user=AdminQueryBudgetTest.admin, author=author
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Число запросов списков админки не зависит от числа строк"""
+        urls = [
+            reverse(f'admin:posts_{model}_changelist')
+            for model in ('post', 'comment', 'follow')
+        ]
+        self.add_content(2)
+        before = {url: self.count_queries(url) for url in urls}
+        self.add_content(10)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+    def test_changelist_search_uses_index(self):
+        """Поиск в списке постов идёт по поисковому индексу"""
+        self.add_content(3)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'Пост'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    @mock.patch('posts.admin.ESTIMATE_THRESHOLD', 5)
+    def test_changelist_count_is_not_truncated(self):
+        """Число строк не обрезается и пересчитывается после правок"""
+        self.add_content(12)
+        url = reverse('admin:posts_post_changelist')
+        response = self.client.get(
+            url, {'pub_date__gte': '2000-01-01 00:00+00:00'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 12)
+        self.add_content(1)
+        response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 13)
+
+    @mock.patch('posts.admin.ESTIMATE_THRESHOLD', 5)
+    @mock.patch('posts.admin.estimate_count', return_value=6)
+    def test_pages_past_estimate_are_reachable(self, estimate):
+        """Страницы за заниженной оценкой числа строк открываются"""
+        self.add_content(12)
+        paginator = EstimatedCountPaginator(Post.objects.order_by('pk'), 5)
+        self.assertEqual(paginator.count, 6)
+        self.assertEqual(len(paginator.page(3)), 2)
+        self.assertEqual(len(paginator.page(4)), 0)
@@ -47,6 +47,18 @@ class PostURLTests(TestCase):
                 'posts:post_detail',
                 kwargs={'post_id': PostURLTests.post.pk}
             ),
+            reverse('posts:index_feed', kwargs={'kind': 'rss'}),
+            reverse(
+                'posts:group_feed',
+                kwargs={'slug': PostURLTests.group.slug, 'kind': 'atom'}
+            ),
+            reverse(
+                'posts:profile_feed',
+                kwargs={
+                    'username': PostURLTests.user.get_username(),
+                    'kind': 'rss',
+                }
+            ),
         ]
         for adress in public_pages:
             with self.subTest(adress=adress):
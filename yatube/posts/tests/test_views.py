@@ -1,5 +1,13 @@
+import json
+import multiprocessing
+import os
+import random
 import shutil
 import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from urllib.parse import unquote
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
@@ -8,9 +16,19 @@ from django.urls import reverse
 from django.conf import settings
 from django import forms
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default
 
-from posts.models import Post, Group, Comment, Follow
-from posts.views import NUMBER_DISPLAY_POSTS
+from posts import cache as post_cache
+from posts import benchmark, dataset, search, thumbnails
+from posts.feeds import FEED_ITEMS
+from posts.models import (
+    Post, Group, Comment, Follow, HotAuthor, TimelineEntry
+)
+from posts.utils import CountedPaginator, encode_cursor, page_window
+from posts.views import NUMBER_DISPLAY_COMMENTS, NUMBER_DISPLAY_POSTS
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -56,6 +74,7 @@ class PostPagesTest(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(PostPagesTest.user)
         cache.clear()
+        default.kvstore.local.clear()
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -91,7 +110,7 @@ class PostPagesTest(TestCase):
         self.assertEqual(first_post.text, 'Тестовый пост')
         self.assertEqual(first_post.author, PostPagesTest.user)
         self.assertEqual(first_post.group, PostPagesTest.group)
-        self.assertEqual(first_post.image, 'posts/test.gif')
+        self.assertEqual(first_post.image, PostPagesTest.post.image)
 
     def test_group_posts_list_page_correct_context(self):
         """Страница posts:group_list сформирована с правильным контекстом"""
@@ -103,7 +122,7 @@ class PostPagesTest(TestCase):
         self.assertEqual(first_post.text, 'Тестовый пост')
         self.assertEqual(first_post.author, PostPagesTest.user)
         self.assertEqual(first_post.group, PostPagesTest.group)
-        self.assertEqual(first_post.image, 'posts/test.gif')
+        self.assertEqual(first_post.image, PostPagesTest.post.image)
         self.assertEqual(response.context['group'], PostPagesTest.group)
 
     def test_profile_posts_list_page_correct_context(self):
@@ -116,7 +135,7 @@ class PostPagesTest(TestCase):
         self.assertEqual(first_post.text, 'Тестовый пост')
         self.assertEqual(first_post.author, PostPagesTest.user)
         self.assertEqual(first_post.group, PostPagesTest.group)
-        self.assertEqual(first_post.image, 'posts/test.gif')
+        self.assertEqual(first_post.image, PostPagesTest.post.image)
         self.assertEqual(response.context['author'], PostPagesTest.user)
         self.assertEqual(response.context['following'], False)
 
@@ -129,7 +148,9 @@ class PostPagesTest(TestCase):
         self.assertEqual(response.context['post'].text, 'Тестовый пост')
         self.assertEqual(response.context['post'].author, PostPagesTest.user)
         self.assertEqual(response.context['post'].group, PostPagesTest.group)
-        self.assertEqual(response.context['post'].image, 'posts/test.gif')
+        self.assertEqual(
+            response.context['post'].image, PostPagesTest.post.image
+        )
 
     def test_create_page_correct_context(self):
         """Страница posts:post_create сформирована с правильным контекстом"""
@@ -217,21 +238,266 @@ class PostPagesTest(TestCase):
         post_comments = response.context['comments']
         self.assertIn(comment, post_comments)
 
+    def test_comments_paginated(self):
+        """На странице поста первая порция комментариев,
+        остальные отдаются по курсору
+        """
+        extra = 5
+        for i in range(NUMBER_DISPLAY_COMMENTS + extra):
+            Comment.objects.create(
+                text=f'Комментарий {i}',
+                author=PostPagesTest.user,
+                post=PostPagesTest.post
+            )
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail',
+            kwargs={'post_id': PostPagesTest.post.pk}
+        ))
+        first_page = response.context['comments']
+        self.assertEqual(len(first_page), NUMBER_DISPLAY_COMMENTS)
+        response = self.client.get(
+            reverse(
+                'posts:comments',
+                kwargs={'post_id': PostPagesTest.post.pk}
+            ),
+            {'cursor': first_page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertEqual(len(response.context['comments']), extra)
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_comment_list_errors(self):
+        """Дозагрузка комментариев: 404 для чужого поста, 400 для курсора"""
+        adress = reverse(
+            'posts:comments', kwargs={'post_id': PostPagesTest.post.pk}
+        )
+        cases = [
+            (reverse('posts:comments', kwargs={'post_id': 10 ** 6}), {}, 404),
+            (adress, {'cursor': 'not-a-cursor'}, 400),
+        ]
+        for url, params, status in cases:
+            with self.subTest(url=url, params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status)
+
+    def test_thumbnail_placeholder_until_generated(self):
+        """Пока миниатюра не готова, вместо картинки выводится заглушка"""
+        adress = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': PostPagesTest.post.pk}
+        )
+        response = self.authorized_client.get(adress)
+        self.assertNotContains(response, '<img src="/media/cache/')
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        thumbnails.generate(PostPagesTest.post.pk)
+        response = self.authorized_client.get(adress)
+        self.assertContains(response, '<img src="/media/cache/')
+        self.assertContains(response, '<source type="image/webp" srcset="')
+        self.assertContains(response, ' 480w, ', count=2)
+
+    def test_generate_image_variants_command(self):
+        """Команда создаёт варианты картинок для существующих постов"""
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+        self.assertIsNotNone(thumbnails.ready_variants(
+            PostPagesTest.post, schedule_missing=False
+        ))
+
     def test_cache_index(self):
-        """Проверка кеширования главной страницы"""
+        """Главная страница берётся из кеша, пока посты не менялись"""
         test_post = Post.objects.create(
             author=PostPagesTest.user,
             text='Test cache',
         )
         response = self.authorized_client.get(reverse('posts:index'))
         content = response.content
-        test_post.delete()
+        Post.objects.filter(pk=test_post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, content)
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, content)
 
+    def test_cache_invalidated_on_post_changes(self):
+        """Кеш лент сбрасывается при создании, правке и удалении поста"""
+        pages = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostPagesTest.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostPagesTest.user.get_username()}
+            ),
+        ]
+        for adress in pages:
+            self.authorized_client.get(adress)
+        new_post = Post.objects.create(
+            author=PostPagesTest.user,
+            text='Новый пост',
+            group=PostPagesTest.group,
+        )
+        for adress in pages:
+            with self.subTest(adress=adress):
+                response = self.authorized_client.get(adress)
+                self.assertContains(response, 'Новый пост')
+        new_post.text = 'Исправленный пост'
+        new_post.save()
+        for adress in pages:
+            with self.subTest(adress=adress):
+                response = self.authorized_client.get(adress)
+                self.assertContains(response, 'Исправленный пост')
+        new_post.delete()
+        for adress in pages:
+            with self.subTest(adress=adress):
+                response = self.authorized_client.get(adress)
+                self.assertNotContains(response, 'Исправленный пост')
+
+    def shared_cache(self):
+        """Файловый кеш во временном каталоге, общий с дочерними процессами"""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        return self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }})
+
+    @skipUnless(
+        'fork' in multiprocessing.get_all_start_methods(),
+        'Нужен запуск процессов через fork'
+    )
+    def test_generations_shared_between_processes(self):
+        """Смена поколения в другом процессе сбрасывает кеш и здесь"""
+        with self.shared_cache():
+            before = post_cache.get_generations('posts')['posts']
+            process = multiprocessing.get_context('fork').Process(
+                target=post_cache.bump, args=('posts',)
+            )
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            self.assertNotEqual(
+                post_cache.get_generations('posts')['posts'], before
+            )
+
+    def test_local_cache_generations_expire(self):
+        """С процессным кешем поколения живут недолго"""
+        self.assertEqual(
+            post_cache.generation_timeout(),
+            settings.POSTS_LOCAL_GENERATION_SECONDS
+        )
+
+    def test_cache_invalidated_when_post_leaves_group(self):
+        """Страница прежней группы обновляется, если пост перенесли"""
+        adress = reverse(
+            'posts:group_list',
+            kwargs={'slug': PostPagesTest.group.slug}
+        )
+        post = Post.objects.create(
+            author=PostPagesTest.user,
+            text='Пост для переноса',
+            group=PostPagesTest.group,
+        )
+        self.assertContains(self.authorized_client.get(adress), post.text)
+        post.group = None
+        post.save()
+        self.assertNotContains(self.authorized_client.get(adress), post.text)
+
+    def test_post_fragment_reused_between_pages(self):
+        """Отрисованный пост берётся из кеша фрагментов на другой ленте"""
+        self.authorized_client.get(reverse('posts:index'))
+        hits = post_cache.stats['post_fragment.hit']
+        self.authorized_client.get(reverse(
+            'posts:profile',
+            kwargs={'username': PostPagesTest.user.get_username()}
+        ))
+        self.assertEqual(post_cache.stats['post_fragment.hit'], hits + 1)
+
+    def test_post_fragment_invalidated_on_author_change(self):
+        """Фрагмент поста обновляется при изменении автора"""
+        self.authorized_client.get(reverse('posts:index'))
+        user = User.objects.get(pk=PostPagesTest.user.pk)
+        user.first_name = 'Новое'
+        user.last_name = 'Имя'
+        user.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+
+    def test_conditional_get_not_modified(self):
+        """Повторный запрос с ETag или Last-Modified получает 304"""
+        pages = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': PostPagesTest.group.slug}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': PostPagesTest.user.get_username()}
+            ),
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': PostPagesTest.post.pk}
+            ),
+        ]
+        for adress in pages:
+            with self.subTest(adress=adress):
+                response = self.authorized_client.get(adress)
+                self.assertEqual(response.status_code, 200)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(
+                        adress, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(len(queries), 3)
+                response = self.authorized_client.get(
+                    adress,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_conditional_get_changes_with_content(self):
+        """ETag страницы поста меняется с новым комментарием"""
+        adress = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': PostPagesTest.post.pk}
+        )
+        etag = self.authorized_client.get(adress)['ETag']
+        Comment.objects.create(
+            post=PostPagesTest.post,
+            author=PostPagesTest.user,
+            text='Новый комментарий',
+        )
+        response = self.authorized_client.get(
+            adress, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertContains(response, 'Новый комментарий')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(
+            Client().get(adress)['ETag'], response['ETag']
+        )
+
+    @skipUnless(
+        'fork' in multiprocessing.get_all_start_methods(),
+        'Нужен запуск процессов через fork'
+    )
+    def test_conditional_get_sees_changes_from_other_process(self):
+        """После правки в другом процессе старый ETag не даёт 304"""
+        adress = reverse('posts:index')
+        with self.shared_cache():
+            etag = self.authorized_client.get(adress)['ETag']
+            # Другой процесс сервера обработал запись и сменил поколение
+            process = multiprocessing.get_context('fork').Process(
+                target=post_cache.bump, args=('posts',)
+            )
+            process.start()
+            process.join()
+            response = self.authorized_client.get(
+                adress, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
     def test_follow_authorized(self):
         """Авторизированный пользователь может подписаться"""
         author = User.objects.create_user(username='Author')
@@ -321,6 +587,42 @@ class PostPagesTest(TestCase):
         page_posts = response.context['page_obj']
         self.assertNotIn(new_post, page_posts)
 
+    def test_follow_backfills_existing_posts(self):
+        """После подписки старые посты автора попадают в ленту"""
+        author = User.objects.create_user(username='Author')
+        old_post = Post.objects.create(text='Старый пост', author=author)
+        Follow.objects.create(user=PostPagesTest.user, author=author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(old_post, response.context['page_obj'])
+
+    def test_unfollow_removes_posts_from_feed(self):
+        """После отписки посты автора пропадают из ленты подписок"""
+        author = User.objects.create_user(username='Author')
+        follow = Follow.objects.create(user=PostPagesTest.user, author=author)
+        post = Post.objects.create(text='Пост автора', author=author)
+        follow.delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(post, response.context['page_obj'])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=PostPagesTest.user).exists()
+        )
+
+    @override_settings(TIMELINE_MAX_FOLLOWERS=0)
+    def test_hot_author_posts_read_on_demand(self):
+        """Посты популярного автора не раскладываются по лентам,
+        но показываются подписчикам
+        """
+        author = User.objects.create_user(username='Author')
+        Follow.objects.create(user=PostPagesTest.user, author=author)
+        post = Post.objects.create(
+            text='Пост популярного автора',
+            author=author
+        )
+        self.assertTrue(HotAuthor.objects.filter(author=author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -385,3 +687,494 @@ class PaginatorViewsTest(TestCase):
                     len(response.context[post_list]),
                     PaginatorViewsTest.num_posts - NUMBER_DISPLAY_POSTS
                 )
+
+    def test_cursor_next_page_contains_remaining_records(self):
+        """Курсор следующей страницы ведёт к оставшимся постам"""
+        adress = reverse('posts:index')
+        first_page = self.client.get(adress).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get(
+            adress, {'cursor': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(
+            len(second_page),
+            PaginatorViewsTest.num_posts - NUMBER_DISPLAY_POSTS
+        )
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(
+            set(first_page.object_list).isdisjoint(second_page.object_list)
+        )
+
+    def test_cursor_previous_page_returns_first_page(self):
+        """Курсор предыдущей страницы возвращает первую страницу"""
+        adress = reverse('posts:index')
+        first_page = self.client.get(adress).context['page_obj']
+        second_page = self.client.get(
+            adress, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        cache.clear()
+        response = self.client.get(
+            adress, {'cursor': second_page.previous_cursor}
+        )
+        page = response.context['page_obj']
+        self.assertEqual(page.object_list, first_page.object_list)
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Испорченный курсор не ломает страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), NUMBER_DISPLAY_POSTS
+        )
+
+    def test_malformed_cursor_values_return_first_page(self):
+        """Курсор с неверными типами значений не приводит к ошибке 500"""
+        post_id = Post.objects.filter(author=PaginatorViewsTest.user)[0].pk
+        comments = reverse('posts:comments', args=[post_id])
+        adresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[PaginatorViewsTest.group.slug]),
+            reverse('posts:profile', args=[PaginatorViewsTest.user.username]),
+            comments,
+            reverse('api:posts'),
+        ]
+        cursors = [
+            encode_cursor('next', [{}, 1]),
+            encode_cursor('next', [[1], 1]),
+            encode_cursor('next', [12345, 1]),
+            encode_cursor('next', [None, 1]),
+            encode_cursor('next', ['2020-01-01T00:00:00', None]),
+        ]
+        for adress in adresses:
+            for cursor in cursors:
+                with self.subTest(adress=adress, cursor=cursor):
+                    response = self.client.get(adress, {'cursor': cursor})
+                    # HTML-страницы показывают первую страницу, а API и
+                    # дозагрузка комментариев отвечают 400
+                    self.assertEqual(
+                        response.status_code,
+                        400 if adress.startswith(('/api/', comments)) else 200
+                    )
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        adress = reverse(
+            'posts:group_list',
+            kwargs={'slug': PaginatorViewsTest.group.slug}
+        )
+        first_page = self.client.get(adress).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(adress, {'cursor': first_page.next_cursor})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+
+    def test_numbered_page_uses_counter(self):
+        """Страница с номером берёт число постов из счётчика группы"""
+        adress = reverse(
+            'posts:group_list',
+            kwargs={'slug': PaginatorViewsTest.group.slug}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(adress, {'page': 2})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            PaginatorViewsTest.num_posts
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'Статистика ANALYZE SQLite')
+    def test_numbered_index_ignores_stale_statistics(self):
+        """Устаревшая статистика СУБД не обрезает страницы главной"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for i in range(NUMBER_DISPLAY_POSTS):
+            Post.objects.create(
+                author=PaginatorViewsTest.user, text=f'Новый пост {i}'
+            )
+        total = PaginatorViewsTest.num_posts + NUMBER_DISPLAY_POSTS
+        last = -(-total // NUMBER_DISPLAY_POSTS)
+        response = self.client.get(reverse('posts:index'), {'page': last})
+        page = response.context['page_obj']
+        self.assertEqual(page.number, last)
+        self.assertEqual(page.paginator.count, total)
+        self.assertEqual(
+            len(page), total - (last - 1) * NUMBER_DISPLAY_POSTS
+        )
+
+    def test_page_window_is_bounded(self):
+        """Число ссылок пагинатора не зависит от числа страниц"""
+        for count in (10 ** 3, 10 ** 6):
+            with self.subTest(count=count):
+                paginator = CountedPaginator(
+                    Post.objects.all(), NUMBER_DISPLAY_POSTS, count=count
+                )
+                window = page_window(paginator.page(50))
+                self.assertEqual(
+                    window,
+                    [1, None, 48, 49, 50, 51, 52, None, paginator.num_pages]
+                )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FeedViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}')
+            for i in range(FEED_ITEMS)
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост в группе', group=cls.group
+        )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_feeds_contain_newest_posts(self):
+        """Ленты содержат только последние посты своей выборки"""
+        feeds = {
+            reverse('posts:index_feed', args=['rss']): FEED_ITEMS,
+            reverse('posts:index_feed', args=['atom']): FEED_ITEMS,
+            reverse(
+                'posts:group_feed', args=[FeedViewTest.group.slug, 'rss']
+            ): 1,
+            reverse(
+                'posts:profile_feed',
+                args=[FeedViewTest.user.get_username(), 'atom']
+            ): FEED_ITEMS,
+        }
+        for adress, items in feeds.items():
+            with self.subTest(adress=adress):
+                response = self.client.get(adress)
+                self.assertContains(response, 'Пост в группе')
+                content = response.content.decode()
+                self.assertEqual(
+                    content.count('<item>') + content.count('<entry>'),
+                    items
+                )
+
+    def test_feed_served_from_cache(self):
+        """Повторный запрос ленты не обращается к базе"""
+        adress = reverse('posts:index_feed', args=['rss'])
+        content = self.client.get(adress).content
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(adress)
+        self.assertEqual(response.content, content)
+        self.assertEqual(len(queries), 0)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                adress, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        Post.objects.create(author=FeedViewTest.user, text='Свежий пост')
+        self.assertContains(self.client.get(adress), 'Свежий пост')
+
+    def test_unknown_feed(self):
+        """Лента несуществующей группы или неизвестного типа — 404"""
+        adresses = [
+            reverse('posts:group_feed', args=['missing', 'rss']),
+            '/group/test-slug/json/',
+        ]
+        for adress in adresses:
+            with self.subTest(adress=adress):
+                self.assertEqual(self.client.get(adress).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.moderator = User.objects.create_user(
+            username='moderator', is_staff=True
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(3)
+        ]
+        cls.posts.append(Post.objects.create(
+            author=cls.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='export.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00'
+                    b'\x00\x00\x00\x3B'
+                ),
+                content_type='image/gif',
+            ),
+        ))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ExportTest.author)
+
+    def test_export_formats(self):
+        """Выгрузка автора отдаётся потоком в JSONL и CSV"""
+        adress = reverse('posts:profile_export', args=['author'])
+        response = self.client.get(adress)
+        self.assertTrue(response.streaming)
+        self.assertIn('author-posts.jsonl', response['Content-Disposition'])
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [post.pk for post in ExportTest.posts]
+        )
+        self.assertEqual(rows[0]['group'], 'test-slug')
+        self.assertEqual(rows[-1]['image'], ExportTest.posts[-1].image.name)
+        response = self.client.get(adress, {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'text', 'pub_date'])
+        self.assertEqual(len(lines), len(ExportTest.posts) + 1)
+
+    def test_export_zip_with_images(self):
+        """Архив содержит выгрузку и картинки постов"""
+        response = self.client.get(
+            reverse('posts:profile_export', args=['author']), {'images': 1}
+        )
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertEqual(archive.namelist(), [
+            'author-posts.jsonl', ExportTest.posts[-1].image.name
+        ])
+        self.assertEqual(
+            len(archive.read('author-posts.jsonl').splitlines()),
+            len(ExportTest.posts)
+        )
+
+    def test_export_permissions(self):
+        """Чужие выгрузки доступны только модераторам"""
+        reader = Client()
+        reader.force_login(ExportTest.reader)
+        moderator = Client()
+        moderator.force_login(ExportTest.moderator)
+        profile = reverse('posts:profile_export', args=['author'])
+        group = reverse('posts:group_export', args=['test-slug'])
+        cases = [
+            (Client(), profile, 302),
+            (reader, profile, 302),
+            (reader, group, 302),
+            (self.client, group, 302),
+            (moderator, profile, 200),
+            (moderator, group, 200),
+        ]
+        for client, adress, status in cases:
+            with self.subTest(adress=adress, status=status):
+                response = client.get(adress)
+                self.assertEqual(response.status_code, status)
+        response = moderator.get(group)
+        self.assertEqual(
+            len(b''.join(response.streaming_content).splitlines()), 3
+        )
+
+    def test_export_command(self):
+        """Команда export_posts пишет ту же выгрузку в файл"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'posts.zip')
+        call_command(
+            'export_posts', group='test-slug', zip=True, output=path,
+            stderr=StringIO(),
+        )
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(
+                len(archive.read('test-slug-posts.jsonl').splitlines()), 3
+            )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_dataset_and_benchmark(self):
+        """Замер проходит по адресам для чтения и не меняет данные"""
+        call_command(
+            'generate_dataset', users=20, groups=3, posts=200, comments=100,
+            follows=60, images=2, image_ratio=0.5, seed=1, stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        output = os.path.join(TEMP_MEDIA_ROOT, 'benchmark.json')
+        follows = list(Follow.objects.values_list('pk', flat=True))
+        call_command(
+            'benchmark_views', requests=3, warmup=1, seed=1, output=output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['meta']['rows']['post'], 200)
+        # Замер ничего не меняет в базе
+        self.assertEqual(
+            list(Follow.objects.values_list('pk', flat=True)), follows
+        )
+        self.assertEqual(set(report['results']), set(
+            benchmark.READ_ONLY_VIEWS + tuple(
+                name for name, _, _ in benchmark.EXTRA_CASES
+            )
+        ))
+        # Поиск замеряется с запросом из словаря набора данных
+        search_query = dict(
+            (name, query) for name, _, query in benchmark.cases()
+        )['search']
+        query = benchmark.Samples(random.Random(1)).query(search_query)
+        self.assertIn(unquote(query.partition('q=')[2]), dataset.WORDS)
+        for name in benchmark.READ_ONLY_VIEWS:
+            with self.subTest(name=name):
+                result = report['results'][name]
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertFalse(
+                    any(code.startswith('5') for code in result['statuses'])
+                )
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='poet', first_name='Александр'
+        )
+        cls.group = Group.objects.create(
+            title='Стихотворения',
+            slug='verses',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Мороз и солнце, день чудесный',
+            group=cls.group,
+        )
+        reader = User.objects.create_user(username='reader')
+        Post.objects.bulk_create([
+            Post(author=reader, text=f'Зимнее утро номер {number}')
+            for number in range(NUMBER_DISPLAY_POSTS + 5)
+        ])
+        search.get_backend().rebuild()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response, list(response.context['page_obj'] or [])
+
+    def test_search_fields(self):
+        """Пост находится по словам текста, группы и автора"""
+        queries = ('мороз', 'СОЛН', 'стихотворения', 'александр')
+        for query in queries:
+            with self.subTest(query=query):
+                _, posts = self.search(query)
+                self.assertIn(SearchViewTest.post, posts)
+
+    def test_search_ranks_text_above_author(self):
+        """Совпадение в тексте весит больше, чем в имени автора"""
+        other = Post.objects.create(
+            author=User.objects.create_user(username='мороз'),
+            text='Совсем другой пост',
+        )
+        _, posts = self.search('мороз')
+        self.assertEqual(posts, [SearchViewTest.post, other])
+
+    def test_search_cursor_pages(self):
+        """Выдача листается курсором без повторов"""
+        response, first = self.search('утро')
+        self.assertEqual(len(first), NUMBER_DISPLAY_POSTS)
+        self.assertContains(response, 'q=%D1%83%D1%82%D1%80%D0%BE&amp;cursor=')
+        _, second = self.search(
+            'утро', cursor=response.context['page_obj'].next_cursor
+        )
+        self.assertEqual(len(second), 5)
+        self.assertFalse(set(first) & set(second))
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста обновляют индекс"""
+        post = Post.objects.create(author=SearchViewTest.user, text='Вьюга')
+        self.assertEqual(self.search('вьюга')[1], [post])
+        post.text = 'Метель'
+        post.save()
+        self.assertEqual(self.search('вьюга')[1], [])
+        self.assertEqual(self.search('метель')[1], [post])
+        post.delete()
+        self.assertEqual(self.search('метель')[1], [])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе считаются обычным текстом"""
+        for query in ('"мороз', 'NOT мороз', 'мороз* OR (', '-', 'text:x'):
+            with self.subTest(query=query):
+                response, _ = self.search(query)
+                self.assertEqual(response.status_code, 200)
+
+    def test_database_backend(self):
+        """Запасной бэкенд находит те же посты"""
+        paginator = search.SearchPaginator(
+            'утро', NUMBER_DISPLAY_POSTS, search.DatabaseBackend()
+        )
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(len(first) + len(second), NUMBER_DISPLAY_POSTS + 5)
+        self.assertFalse(set(first) & set(second))
+
+    def test_malformed_cursor_values(self):
+        """Курсор с неверными типами значений даёт первую страницу"""
+        cursors = [
+            encode_cursor('next', [[1], 1]),
+            encode_cursor('next', [{}, 1]),
+            encode_cursor('next', [None, 1]),
+            encode_cursor('next', [1.5, '1']),
+            encode_cursor('next', ['2020-01-01', [1]]),
+        ]
+        backends = [search.SQLiteFTSBackend(), search.DatabaseBackend()]
+        for backend in backends:
+            paginator = search.SearchPaginator(
+                'утро', NUMBER_DISPLAY_POSTS, backend
+            )
+            for cursor in cursors:
+                with self.subTest(backend=backend, cursor=cursor):
+                    page = paginator.get_page(cursor)
+                    self.assertEqual(len(page), NUMBER_DISPLAY_POSTS)
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'утро', 'cursor': cursors[0]}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        """Команда пересоздаёт индекс по всем постам"""
+        Post.objects.filter(pk=SearchViewTest.post.pk).update(text='Ночь')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('ночь')[1], [SearchViewTest.post])
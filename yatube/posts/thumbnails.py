@@ -0,0 +1,147 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры создаются в пуле posts.tasks сразу после сохранения картинки:
+по одной на каждую ширину из POSTS_IMAGE_VARIANT_WIDTHS и каждый формат
+из POSTS_IMAGE_VARIANT_FORMATS. Шаблоны только ищут готовые миниатюры
+в хранилище метаданных sorl и, пока их нет, показывают заглушку вместо
+того, чтобы ждать PIL.
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings as django_settings
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings, defaults as default_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache, tasks
+from .models import Post
+
+POST_WIDTH = 960
+POST_HEIGHT = 339
+POST_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширина колонки ленты: на узких экранах картинка занимает всю ширину
+POST_SIZES = f'(max-width: {POST_WIDTH}px) 100vw, {POST_WIDTH}px'
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+Picture = namedtuple('Picture', 'img srcset sources sizes')
+
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, умеющий искать миниатюру, не создавая её"""
+
+    def _normalize_options(self, source, options):
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Вернуть миниатюру, если она уже создана, иначе None"""
+        source = ImageFile(file_)
+        options = self._normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def variant_formats():
+    """Форматы вариантов, которые поддерживает установленный Pillow"""
+    return [
+        image_format
+        for image_format in django_settings.POSTS_IMAGE_VARIANT_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def variants():
+    """Пары (формат, геометрия) всех вариантов картинки поста"""
+    return [
+        (image_format, f'{width}x{round(width * POST_HEIGHT / POST_WIDTH)}')
+        for image_format in variant_formats()
+        for width in django_settings.POSTS_IMAGE_VARIANT_WIDTHS
+    ]
+
+
+def generate(post_id):
+    """Создать варианты картинки поста и сбросить кеш его страниц"""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    try:
+        if post is None or not post.image:
+            return
+        for image_format, geometry in variants():
+            default.backend.get_thumbnail(
+                post.image, geometry, format=image_format, **POST_OPTIONS
+            )
+        cache.bump(*cache.post_scopes(post))
+    finally:
+        with _scheduled_lock:
+            _scheduled.discard(post_id)
+
+
+def schedule(post_id):
+    """Поставить создание миниатюр в очередь, если его там ещё нет"""
+    with _scheduled_lock:
+        if post_id in _scheduled:
+            return
+        _scheduled.add(post_id)
+    tasks.submit(generate, post_id)
+
+
+def ready_variants(post, schedule_missing=True):
+    """Готовые варианты картинки {формат: [миниатюры]} или None.
+
+    None возвращается, если хотя бы один вариант ещё не создан; тогда
+    создание ставится в очередь, если не передано schedule_missing=False.
+    """
+    if not post.image:
+        return None
+    ready = {}
+    for image_format, geometry in variants():
+        thumbnail = default.backend.get_ready_thumbnail(
+            post.image, geometry, format=image_format, **POST_OPTIONS
+        )
+        if thumbnail is None:
+            if schedule_missing:
+                schedule(post.pk)
+            return None
+        ready.setdefault(image_format, []).append(thumbnail)
+    return ready
+
+
+def _srcset(thumbnails):
+    return ', '.join(f'{image.url} {image.width}w' for image in thumbnails)
+
+
+def ready_picture(post):
+    """Данные для <picture> картинки поста или None, пока их готовят.
+
+    Последний формат из POSTS_IMAGE_VARIANT_FORMATS используется для
+    <img>, остальные становятся <source>.
+    """
+    ready = ready_variants(post)
+    if not ready:
+        return None
+    *source_formats, img_format = ready
+    img_variants = ready[img_format]
+    img = min(img_variants, key=lambda image: abs(image.width - POST_WIDTH))
+    return Picture(
+        img=img,
+        srcset=_srcset(img_variants),
+        sources=[
+            (MIME_TYPES[image_format], _srcset(ready[image_format]))
+            for image_format in source_formats
+        ],
+        sizes=POST_SIZES,
+    )
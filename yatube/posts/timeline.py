@@ -0,0 +1,122 @@
+"""Материализованные ленты подписок (fan-out-on-write).
+
+Новый пост сразу записывается в ленты всех подписчиков автора, поэтому
+лента подписок читается одним диапазоном по индексу (user, -pub_date).
+Посты популярных и плодовитых авторов (HotAuthor) в ленты не
+раскладываются и подмешиваются при чтении (fan-out-on-read).
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import AuthorStats, Follow, HotAuthor, Post, TimelineEntry
+
+BATCH_SIZE = 500
+FEED_ORDERING = ('-feed_date', '-feed_post')
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(author_id, user_ids):
+    """Добавить последние посты автора в ленты пользователей"""
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL_POSTS]
+    )
+    if not posts:
+        return
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, pub_date in posts
+    )
+
+
+def refresh_author(author_id):
+    """Пересчитать, считается ли автор популярным, и вернуть результат.
+
+    Если автор перестал быть популярным, его последние посты
+    раскладываются по лентам подписчиков, чтобы лента не потеряла
+    записи, опубликованные, пока он был популярным.
+    """
+    followers, posts = AuthorStats.objects.filter(
+        user_id=author_id
+    ).values_list('followers_count', 'posts_count').first() or (0, 0)
+    hot = (
+        followers > settings.TIMELINE_MAX_FOLLOWERS
+        or posts > settings.TIMELINE_MAX_POSTS
+    )
+    if hot:
+        HotAuthor.objects.get_or_create(author_id=author_id)
+        return True
+    deleted, _ = HotAuthor.objects.filter(author_id=author_id).delete()
+    if deleted:
+        backfill(
+            author_id,
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True).iterator()
+        )
+    return False
+
+
+def post_published(post):
+    """Разложить новый пост по лентам подписчиков автора"""
+    if refresh_author(post.author_id):
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True).iterator()
+    )
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def post_removed(post):
+    refresh_author(post.author_id)
+
+
+def follow_added(follow):
+    if not refresh_author(follow.author_id):
+        backfill(follow.author_id, [follow.user_id])
+
+
+def follow_removed(follow):
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id,
+    ).delete()
+    refresh_author(follow.author_id)
+
+
+def feed_for(user):
+    """Вернуть queryset постов ленты подписок пользователя.
+
+    Посты аннотированы ключом ленты FEED_ORDERING: для обычной ленты он
+    берётся из TimelineEntry, поэтому страница читается диапазоном
+    индекса (user, -pub_date, -post) без сортировки.
+    """
+    hot_authors = list(
+        Follow.objects.filter(
+            user=user, author__hot_author__isnull=False
+        ).values_list('author_id', flat=True)
+    )
+    if not hot_authors:
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=hot_authors)
+    ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
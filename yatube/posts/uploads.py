@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и перестаёт писать после лимита.
+
+    Файл больше POSTS_IMAGE_MAX_UPLOAD_SIZE не копится ни в памяти, ни на
+    диске: остаток тела запроса отбрасывается, а размер файла остаётся
+    настоящим, поэтому форма отклоняет его, не открывая картинку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_UPLOAD_SIZE:
+            return None
+        return super().receive_data_chunk(raw_data, start)
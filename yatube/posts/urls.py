@@ -1,12 +1,31 @@
-from django.urls import path
-from . import views
+from django.urls import path, register_converter
+from . import feeds, views
+
+register_converter(feeds.FeedKindConverter, 'feed')
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('<feed:kind>/', feeds.index_feed, name='index_feed'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/<feed:kind>/',
+        feeds.group_feed, name='group_feed'
+    ),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export, name='group_export'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export, name='profile_export'
+    ),
+    path(
+        'profile/<str:username>/<feed:kind>/',
+        feeds.profile_feed, name='profile_feed'
+    ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
@@ -14,6 +33,11 @@ urlpatterns = [
         'posts/<int:post_id>/comment/',
         views.add_comment, name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comment_list, name='comments'
+    ),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
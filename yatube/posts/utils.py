@@ -1,7 +1,255 @@
+import base64
+import binascii
+import collections.abc
+import json
+
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+PAGE_PARAM = 'page'
+CURSOR_PARAM = 'cursor'
+POST_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('-created', '-pk')
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать"""
+
+
+def encode_cursor(direction, values):
+    """Упаковать направление и значения ключа в непрозрачную строку"""
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковать курсор, созданный encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in ('next', 'previous') or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+class CountedPaginator(Paginator):
+    """Paginator с заранее известным числом объектов.
+
+    Число берётся из денормализованного счётчика или кеша, поэтому
+    страница с номером обходится без COUNT(*). Оценка по статистике СУБД
+    сюда не годится: get_page прижимает номера за её пределами к
+    последней оценённой странице.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.__dict__['count'] = count
+
+
+def page_window(page, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей, первые и последние.
+
+    Пропуски обозначаются None, поэтому число ссылок не зависит от
+    общего числа страниц.
+    """
+    number = page.number
+    num_pages = page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    window = []
+    if number > on_each_side + on_ends + 1:
+        window.extend(range(1, on_ends + 1))
+        window.append(None)
+        window.extend(range(number - on_each_side, number + 1))
+    else:
+        window.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends:
+        window.extend(range(number + 1, number + on_each_side + 1))
+        window.append(None)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(number + 1, num_pages + 1))
+    return window
+
+
+def estimate_count(model):
+    """Оценить число строк таблицы по статистике СУБД без COUNT(*).
+
+    Возвращает None, если статистики нет (например, для SQLite не
+    выполнялся ANALYZE).
+    """
+    table = model._meta.db_table
+    queries = {
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+        'postgresql': 'SELECT reltuples FROM pg_class WHERE relname = %s',
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(queries[connection.vendor], [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0].split('.')[0])
+    return estimate if estimate > 0 else None
+
+
+class CursorPage(collections.abc.Sequence):
+    """Страница курсорной пагинации.
+
+    Повторяет интерфейс django.core.paginator.Page, который используют
+    шаблоны, но вместо номеров страниц отдаёт курсоры соседних страниц.
+    """
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset) вместо LIMIT/OFFSET.
+
+    Каждая страница выбирается условием «строго после/до ключа последней
+    показанной записи», поэтому глубокие страницы стоят столько же, сколько
+    первая, а запрос COUNT(*) не нужен.
+    """
+
+    def __init__(self, object_list, per_page, ordering=POST_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    @cached_property
+    def count(self):
+        """Точное число объектов; вычисляется только по требованию"""
+        return self.object_list.count()
+
+    def _fields(self):
+        model = self.object_list.model
+        for name in self.ordering:
+            attname = name.lstrip('-')
+            annotations = self.object_list.query.annotations
+            if attname == 'pk':
+                field = model._meta.pk
+            elif attname in annotations:
+                field = annotations[attname].output_field
+            else:
+                field = model._meta.get_field(attname)
+            yield attname, field, name.startswith('-')
+
+    def _key(self, obj):
+        values = []
+        for attname, _, _ in self._fields():
+            value = getattr(obj, attname)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return values
+
+    def _seek(self, values, backwards):
+        fields = list(self._fields())
+        if len(values) != len(fields):
+            raise InvalidCursor(values)
+        try:
+            values = [
+                field.to_python(value)
+                for (_, field, _), value in zip(fields, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(values)
+        if None in values:
+            raise InvalidCursor(values)
+        condition = Q()
+        equal = {}
+        for (attname, _, descending), value in zip(fields, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{attname}__{lookup}': value})
+            equal[attname] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def page(self, cursor=None):
+        """Вернуть страницу, на которую указывает курсор"""
+        direction, values = (
+            decode_cursor(cursor) if cursor else ('next', None)
+        )
+        backwards = direction == 'previous'
+        queryset = self.object_list.order_by(
+            *(self._reversed_ordering() if backwards else self.ordering)
+        )
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        has_next = True if backwards else has_more
+        has_previous = has_more if backwards else values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor('next', self._key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor('previous', self._key(rows[0]))
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Как page(), но на испорченный курсор отдаёт первую страницу"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
 
+def get_page(request, posts, posts_on_page, count=None,
+             ordering=POST_ORDERING):
+    """Вернуть страницу постов для запроса.
 
-def get_page(request, posts, posts_on_page):
-    paginator = Paginator(posts, posts_on_page)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    По умолчанию используется курсорная пагинация; параметр ?page=
+    оставлен для ссылок с номерами страниц. Для него можно передать
+    count — число постов или функцию, которая его вернёт, — чтобы не
+    выполнять COUNT(*). ordering задаёт ключ курсорной пагинации.
+    """
+    if PAGE_PARAM in request.GET:
+        if callable(count):
+            count = count()
+        paginator = CountedPaginator(posts, posts_on_page, count=count)
+        return paginator.get_page(request.GET.get(PAGE_PARAM))
+    paginator = CursorPaginator(posts, posts_on_page, ordering)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
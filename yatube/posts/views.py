@@ -1,33 +1,58 @@
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, Follow
+from django.db import transaction
+from . import export
+from .cache import cache_feed, cached_count, conditional_feed
+from .models import AuthorStats, Comment, Post, Group, Follow
 from .forms import PostForm, CommentForm
-from .utils import get_page
+from .search import SearchPaginator
+from .timeline import FEED_ORDERING, feed_for
+from .utils import (
+    COMMENT_ORDERING, CURSOR_PARAM, CursorPaginator, InvalidCursor, get_page
+)
 
 NUMBER_DISPLAY_POSTS = 10
-CACHE_SECONDS = 20
+NUMBER_DISPLAY_COMMENTS = 20
+CACHE_SECONDS = 60 * 60 * 6
 
 User = get_user_model()
 
 
-@cache_page(CACHE_SECONDS, key_prefix='index_page')
+def post_author_scope(post_id):
+    """Область автора поста: на странице поста есть число его постов"""
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return [f'author:{username}'] if username is not None else []
+
+
+@conditional_feed('posts', 'groups', 'users')
+@cache_feed('posts', 'groups', 'users', timeout=CACHE_SECONDS)
 def index(request):
     """Отобразить главную страницу"""
-    post_list = Post.objects.all()
-    page_obj = get_page(request, post_list, NUMBER_DISPLAY_POSTS)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page(
+        request, post_list, NUMBER_DISPLAY_POSTS,
+        count=lambda: cached_count('posts', post_list, CACHE_SECONDS),
+    )
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_feed('group:{slug}', 'groups', 'users')
+@cache_feed('group:{slug}', 'groups', 'users', timeout=CACHE_SECONDS)
 def group_posts(request, slug):
     """Отобразить все посты определенной группы"""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.group.all()
-    page_obj = get_page(request, post_list, NUMBER_DISPLAY_POSTS)
+    post_list = group.group.select_related('author', 'group')
+    page_obj = get_page(
+        request, post_list, NUMBER_DISPLAY_POSTS, count=group.posts_count
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -35,11 +60,18 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed('author:{username}', 'groups', 'users')
+@cache_feed('author:{username}', 'groups', 'users', timeout=CACHE_SECONDS)
 def profile(request, username):
     """Отобразить профиль пользователя"""
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    page_obj = get_page(request, post_list, NUMBER_DISPLAY_POSTS)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = user.posts.select_related('author', 'group')
+    page_obj = get_page(
+        request, post_list, NUMBER_DISPLAY_POSTS,
+        count=lambda: getattr(user, 'stats', AuthorStats()).posts_count,
+    )
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(user=request.user, author=user).exists()
@@ -52,16 +84,107 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_feed(
+    'post:{post_id}', 'groups', 'users', scopes=post_author_scope
+)
 def post_detail(request, post_id):
     """Вывести подробную информацию про пост"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        NUMBER_DISPLAY_COMMENTS,
+        ordering=COMMENT_ORDERING,
+    ).get_page()
     context = {
         'post': post,
+        'comments': comments,
         'form': CommentForm(),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_list(request, post_id):
+    """Отдать следующую порцию комментариев к посту.
+
+    Порцию дописывают после уже показанных, поэтому на испорченный курсор
+    отдаётся 400, а не первая порция: она повторила бы комментарии.
+    """
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        NUMBER_DISPLAY_COMMENTS,
+        ordering=COMMENT_ORDERING,
+    )
+    try:
+        comments = paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+def search(request):
+    """Отобразить посты, найденные по тексту, группе или автору"""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = SearchPaginator(query, NUMBER_DISPLAY_POSTS).get_page(
+            request.GET.get(CURSOR_PARAM)
+        )
+    context = {
+        'query': query,
+        'query_string': urlencode({'q': query}),
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def export_response(request, posts, name):
+    """Отдать выгрузку постов потоком, не загружая их в память"""
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in export.WRITERS:
+        file_format = 'jsonl'
+    images = 'images' in request.GET
+    compress = images or 'zip' in request.GET
+    extension = 'zip' if compress else file_format
+    response = StreamingHttpResponse(
+        export.chunks(posts, file_format, compress, name, images),
+        content_type=export.CONTENT_TYPES[extension],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    """Выгрузить все посты автора; доступно автору и модераторам"""
+    author = get_object_or_404(User, username=username)
+    if author != request.user and not request.user.is_staff:
+        return redirect('posts:profile', username)
+    return export_response(
+        request, export.posts_for(author=author), f'{username}-posts'
+    )
+
+
+@login_required
+def group_export(request, slug):
+    """Выгрузить все посты группы; доступно модераторам"""
+    group = get_object_or_404(Group, slug=slug)
+    if not request.user.is_staff:
+        return redirect('posts:group_list', slug)
+    return export_response(
+        request, export.posts_for(group=group), f'{slug}-posts'
+    )
+
+
 @login_required
 def post_create(request):
     """Создание поста"""
@@ -73,7 +196,8 @@ def post_create(request):
         if post_form.is_valid():
             new_post = post_form.save(commit=False)
             new_post.author = request.user
-            new_post.save()
+            with transaction.atomic():
+                new_post.save()
             return redirect('posts:profile', new_post.author.get_username())
         return render(request, 'posts/create_post.html', {'form': post_form})
     post_form = PostForm()
@@ -84,7 +208,7 @@ def post_create(request):
 def post_edit(request, post_id):
     """Изменение поста"""
     post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     context = {
         'post': post,
@@ -100,7 +224,8 @@ def post_edit(request, post_id):
             instance=post
         )
         if post_form.is_valid():
-            post_form.save()
+            with transaction.atomic():
+                post_form.save()
             return redirect('posts:post_detail', post_id)
         context['form'] = post_form
         return render(request, 'posts/create_post.html', context)
@@ -116,15 +241,18 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     """Получить посты авторов, на которых пользователь подписан"""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page(request, post_list, NUMBER_DISPLAY_POSTS)
+    post_list = feed_for(request.user).select_related('author', 'group')
+    page_obj = get_page(
+        request, post_list, NUMBER_DISPLAY_POSTS, ordering=FEED_ORDERING
+    )
     context = {
         'page_obj': page_obj,
     }
@@ -139,11 +267,12 @@ def profile_follow(request, username):
         user=request.user,
         author=author,
     )
-    if not follow.exists() and author != request.user:
-        Follow.objects.create(
-            user=request.user,
-            author=author,
-        )
+    with transaction.atomic():
+        if not follow.exists() and author != request.user:
+            Follow.objects.create(
+                user=request.user,
+                author=author,
+            )
     return redirect('posts:profile', username)
 
 
@@ -155,6 +284,6 @@ def profile_unfollow(request, username):
         user=request.user,
         author=author,
     )
-    if follow.exists():
+    with transaction.atomic():
         follow.delete()
     return redirect('posts:profile', username)
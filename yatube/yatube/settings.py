@@ -39,6 +39,19 @@ ALLOWED_HOSTS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдача медиафайлов (core.media): каталоги, доступные без входа, и
+# файлы, содержимое которых не меняется (имена по хешу содержимого)
+MEDIA_PUBLIC_PREFIXES = ['posts/', 'cache/']
+MEDIA_IMMUTABLE_PATTERNS = [
+    r'^posts/(.+/)?[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$',
+    r'^cache/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}(\.\w+)?$',
+]
+MEDIA_MAX_AGE = 60 * 60
+# Заголовок, которым файл передаётся фронтенд-серверу: 'X-Accel-Redirect'
+# (nginx, путь внутри internal-локации MEDIA_SENDFILE_PREFIX) или
+# 'X-Sendfile'. Пустая строка — отдавать файл из Django
+MEDIA_SENDFILE_HEADER = ''
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
 
 # Application definition
 
@@ -53,10 +66,12 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,11 +83,21 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Метрики запросов (core.metrics): /metrics/ доступен сотрудникам, а без
+# входа — только адресам из METRICS_ALLOWED_IPS. Адрес берётся из
+# REMOTE_ADDR, поэтому за nginx все запросы приходят с 127.0.0.1: список
+# можно заполнять, только если прокси подставляет настоящий адрес клиента
+# в REMOTE_ADDR (например, модулем realip) или сборщик метрик ходит к
+# приложению в обход прокси. METRICS_LOG_INTERVAL — как часто писать
+# сводку в журнал core.metrics (0 — не писать)
+METRICS_ALLOWED_IPS = []
+METRICS_LOG_INTERVAL = 0
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -95,10 +120,18 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.db.sqlite3 — SQLite с WAL, busy_timeout и BEGIN IMMEDIATE для
+# нескольких процессов сервера. Постоянные соединения: CONN_MAX_AGE
+# в секундах, например 60.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pragmas': {},
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -146,8 +179,76 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Кеш должен быть общим для всех процессов сервера: в нём лежат
+# поколения областей (posts.cache), по которым сбрасываются страницы и
+# строятся ETag. В продакшене это memcached: адреса серверов через
+# запятую задаются в YATUBE_MEMCACHED (нужен пакет python-memcached).
+# Без него используется файловый кеш в каталоге проекта. FileBasedCache
+# при каждой записи перечисляет свои файлы, чтобы решить, не пора ли
+# чистить, поэтому MAX_ENTRIES невелик, а сам он годится для разработки
+# и небольшой установки. С процессным LocMemCache поколения живут только
+# POSTS_LOCAL_GENERATION_SECONDS, поэтому страницы в других процессах
+# устаревают не дольше чем на это время. Тесты получают отдельный
+# LocMemCache, см. core.runner.
+if os.environ.get('YATUBE_MEMCACHED'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['YATUBE_MEMCACHED'].split(','),
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get(
+                'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, '.cache')
+            ),
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+POSTS_LOCAL_GENERATION_SECONDS = 20
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Лента подписок: посты авторов, у которых подписчиков или постов больше
+# этих порогов, подмешиваются в ленту при чтении, а не при публикации
+TIMELINE_MAX_FOLLOWERS = 1000
+TIMELINE_MAX_POSTS = 10000
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL_POSTS = 100
+
+# Число потоков для фоновых задач постов (миниатюры картинок).
+# При 0 задачи выполняются в потоке запроса после фиксации транзакции
+POSTS_WORKERS = 2
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.PostThumbnailBackend'
+
+# Метаданные миниатюр: LRU в памяти процесса перед кешем Django и
+# постоянным хранилищем. Если путь к SQLite-файлу пуст, записи хранятся
+# в основной базе. Раз в POSTS_THUMBNAIL_LRU_CHECK_SECONDS процесс
+# сверяет поколение записей в общем кеше и сбрасывает LRU после удалений
+# в других процессах
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+POSTS_THUMBNAIL_LRU_SIZE = 10000
+POSTS_THUMBNAIL_LRU_TIMEOUT = 60 * 60
+POSTS_THUMBNAIL_LRU_CHECK_SECONDS = 1
+POSTS_THUMBNAIL_KVSTORE_PATH = ''
+
+# Загрузка картинок постов: файл пишется во временный файл, слишком
+# большие файлы и картинки отклоняются до декодирования, а сохранённые
+# картинки уменьшаются и пережимаются в фоне
+FILE_UPLOAD_HANDLERS = ['posts.uploads.ImageUploadHandler']
+POSTS_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 50_000_000
+POSTS_IMAGE_MAX_DIMENSION = 2048
+POSTS_IMAGE_QUALITY = 85
+# Варианты картинок постов для srcset: ширины и форматы. Последний формат
+# используется для <img> в браузерах без поддержки остальных
+POSTS_IMAGE_VARIANT_WIDTHS = [480, 960, 1440]
+POSTS_IMAGE_VARIANT_FORMATS = ['WEBP', 'JPEG']
+
+# Полнотекстовый поиск по постам: SQLite FTS5 или, для других СУБД,
+# posts.search.DatabaseBackend
+POSTS_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'